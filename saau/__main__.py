@@ -1,34 +1,53 @@
 import os
 import sys
+import time
 import types
 import logging
 import warnings
 import argparse
 from operator import itemgetter
+from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor as PoolExecutor
+from concurrent.futures import as_completed, wait
 from os.path import join, dirname, exists, expanduser
 
 
 STATS_DATA = 'c:\\stats_data'
 CACHE = join(STATS_DATA, 'cache')
 OUTPUT = join(STATS_DATA, 'output')
+PREVIEW = join(STATS_DATA, 'preview')
 HERE = dirname(__file__)
 logging.basicConfig(level=logging.DEBUG)
 sys.path.insert(0, expanduser('~/Dropbox/temp/arcrest'))
-
-from .services import Services
-from .utils import get_name, move_old
-from .utils.shape import ShapeFileNotFoundException
-from .loading import load_image_providers, load_service_providers
-
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from betamax import Betamax
-
-
-with Betamax.configure() as conf:
-    conf.cassette_library_dir = join(CACHE, 'cassettes')
+# matplotlib and friends are only imported once something is rendered
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from .services import Services, required_services
+from .history import BuildHistory, shard_filename
+from .manifest import BuildManifest, provider_inputs, source_files
+from .sharding import (
+    parse_shard, select_shard, assign_shards, render_cost, makespan
+)
+from .watch import Watcher, reload_provider, watched_paths
+from .outputs import parse_output, extra_filenames, save_outputs
+from . import outputs, cache
+from .utils import (
+    get_name, move_old, profiling, preview, leaks, tracing,
+    ShapeFileNotFoundException
+)
+from .utils.memory import PeakMemory, parse_size
+from .utils.leaks import LeakCheck
+from .utils.lazy import lazy_import
+from .loading import (
+    ProviderEntry, find_image_providers, find_service_providers, load_classes
+)
+
+plt = lazy_import('matplotlib.pyplot')
+
+RenderResult = namedtuple(
+    'RenderResult',
+    'name,output,inputs,peak_rss,duration'
+)
 
 
 def dir_for_thing(thing):
@@ -48,25 +67,28 @@ def ensure_data(prov):
     """
     Given that `prov`
     """
-    if not prov.has_required_data() and hasattr(prov, 'obtain_data'):
-        logging.info('Obtaining data for %s', get_name(prov))
-        try:
-            val = prov.obtain_data()
-        except Exception as e:
-            logging.exception(e)
-            return False
-
-        if val not in {True, False}:
-            warnings.warn(
-                '{}.obtain_data() should return an explicit boolean value'
-                .format(get_name(prov))
-            )
-
-        if not val:
-            logging.warning("Couldn't obtain data for %s", get_name(prov))
-
-        return val
-    return True
+    with tracing.span(get_name(prov), 'ensure_data'):
+        if not prov.has_required_data() and hasattr(prov, 'obtain_data'):
+            logging.info('Obtaining data for %s', get_name(prov))
+            try:
+                with profiling.provider(get_name(prov)):
+                    with profiling.phase('obtain_data'):
+                        val = prov.obtain_data()
+            except Exception as e:
+                logging.exception(e)
+                return False
+
+            if val not in {True, False}:
+                warnings.warn(
+                    '{}.obtain_data() should return an explicit boolean value'
+                    .format(get_name(prov))
+                )
+
+            if not val:
+                logging.warning("Couldn't obtain data for %s", get_name(prov))
+
+            return val
+        return True
 
 
 def threaded_filter(predicate, iterable):
@@ -83,80 +105,278 @@ def threaded_filter(predicate, iterable):
 
 def initialize_providers(provs, services):
     return [
-        prov(join(CACHE, dir_for_thing(prov)), services)
+        prov(join(CACHE, dir_for_thing(prov)), services.tracked())
         for prov in provs
     ]
 
 
-def setup(args):
-    image_providers = list(load_image_providers(args.filter))
+def create_service(serv, services):
+    """
+    Creates `serv` and obtains its data; called by the `Services` container
+    the first time `serv` is used
+    """
+    logging.info('Setting up %s', get_name(serv))
+    if isinstance(serv, ProviderEntry):
+        serv = serv.load()
+
+    build_tree(CACHE, [serv])
+    serv, = initialize_providers([serv], services)
+
+    if not ensure_data(serv):
+        logging.warning("Couldn't initialize %s", get_name(serv))
+
+    return serv
 
-    logging.info('Building directories')
-    build_tree(CACHE, image_providers)
-    build_tree(OUTPUT, image_providers)
 
+def configure_cassettes():
+    from betamax import Betamax
+
+    with Betamax.configure() as conf:
+        conf.cassette_library_dir = join(CACHE, 'cassettes')
+
+
+def setup_services():
+    """
+    Builds a `Services` container, in which each service is only created
+    once it's first used
+    """
     logging.info('Setting up services')
-    services_container = Services()
+    configure_cassettes()
 
-    services = list(load_service_providers(None))
-    services = initialize_providers(services, services_container)
-    build_tree(CACHE, services)
-    ret = list(filter(ensure_data, services))
-    services_container.inject(services)
-    if not all(ret):
-        logging.warning("Couldn't initialize services")
+    services_container = Services(create_service)
+    # services are only imported once they're used
+    services_container.register(find_service_providers(None))
+
+    return services_container
+
+
+def ready_providers(image_providers, services, threads=10):
+    """
+    Obtains the data for the image providers and the services they require
+    concurrently, yielding each image provider as soon as it and its
+    services have their data, while the remaining downloads continue in the
+    background. Those that can't get their data are filtered out.
+    """
+    with PoolExecutor(threads) as exe:
+        service_futures = {
+            name: exe.submit(getattr, services, name)
+            for name in required_services(image_providers, services)
+        }
+        futures = {
+            exe.submit(ensure_data, prov): prov
+            for prov in image_providers
+        }
+
+        for future in as_completed(futures):
+            prov = futures[future]
+            try:
+                if not future.result():
+                    continue
+            except Exception as e:
+                logging.exception(e)
+                continue
+
+            wait([
+                service_futures[name]
+                for name in required_services([prov], services)
+            ])
+
+            yield prov
+
+
+def select_providers(args):
+    """
+    The entries for the image providers to build, which are yet to be
+    imported
+    """
+    image_providers = find_image_providers(args.filter)
+
+    if args.shard:
+        # sharded builds don't update the shared history, so every shard
+        # sees the same one however their builds overlap
+        history = (
+            BuildHistory(args.shard_history) if args.shard_history
+            else load_history()
+        )
+        image_providers = select_shard(image_providers, args.shard, history)
+        logging.info(
+            'Shard %d of %d has %d image providers',
+            *args.shard, len(image_providers)
+        )
+
+    return image_providers
+
+
+def setup(args, services_container):
+    image_providers = list(load_classes(select_providers(args)))
+
+    logging.info('Building directories')
+    build_tree(CACHE, image_providers)
+    build_tree(output_root(), image_providers)
 
     image_providers = initialize_providers(image_providers, services_container)
 
     logging.info('Downloading requisite data')
-    # grab the data for each image_provider.
-    # those that can't get their data, we filter out
-    return list(filter(ensure_data, image_providers))
+    return ready_providers(image_providers, services_container)
+
+
+def load_manifest(shard=None):
+    # shards each keep their own manifest, which collect merges
+    filename = (
+        'manifest.shard-{}-of-{}.json'.format(*shard) if shard
+        else 'manifest.json'
+    )
+    return BuildManifest(
+        join(output_root(), filename),
+        join(CACHE, 'fingerprints.json')
+    )
+
+
+def load_history(shard=None):
+    # previews would skew the measurements of full renders
+    filename = join(
+        CACHE, 'history.preview.json' if preview.enabled else 'history.json'
+    )
+    # shards each save their own history, which collect merges
+    return BuildHistory(
+        filename, shard_filename(filename, shard) if shard else None
+    )
+
+
+def record_result(result, manifest, history):
+    # failed renders stop early, and would understate what a render takes
+    if result.output is None:
+        return
+
+    manifest.record(result.output, result.inputs)
+    history.record(
+        result.name,
+        peak_rss=result.peak_rss,
+        duration=result.duration
+    )
+
 
+def output_root():
+    # previews are kept apart from the real thing
+    return PREVIEW if preview.enabled else OUTPUT
+
+
+def output_for(prov):
+    return join(
+        output_root(),
+        dir_for_thing(prov),
+        '{}.png'.format(prov.__module__.split('.')[-1])
+    )
+
+
+def build_images(image_providers, rerender_all=False, threads=1, workers=1,
+                 memory_budget=None, shard=None, max_renders=None,
+                 max_worker_rss=None):
+    manifest = load_manifest(shard)
+    history = load_history(shard)
 
-def build_images(image_providers, rerender_all=False, threads=1):
     if rerender_all:
         logging.info('Rerendering all images')
     else:
         logging.info('Rendering images')
 
-    if threads == 1:
-        for prov in image_providers:
-            build_image(prov, rerender_all)
+    def is_stale(prov):
+        output = output_for(prov)
+        if rerender_all or not manifest.is_fresh(output):
+            return True
+        if not all(map(exists, extra_filenames(output))):
+            logging.info('Some outputs of %s are missing', get_name(prov))
+            return True
+        logging.info('Inputs to %s are unchanged', get_name(prov))
+        return False
+
+    # providers are rendered as soon as they become ready
+    image_providers = filter(is_stale, image_providers)
+
+    if workers == 1 and (memory_budget or max_renders or max_worker_rss):
+        logging.warning(
+            'Memory budgets and worker recycling only apply to render workers'
+        )
+
+    if workers > 1:
+        from .workers import render_in_processes
+        results = render_in_processes(
+            image_providers,
+            workers,
+            memory_budget,
+            history,
+            max_renders,
+            max_worker_rss
+        )
+    elif threads == 1:
+        results = map(build_image, image_providers)
     else:
         with PoolExecutor(threads) as exe:
-            exe.map(
-                lambda prov: build_image(prov, rerender_all),
-                image_providers
-            )
+            futures = [
+                exe.submit(build_image, prov)
+                for prov in image_providers
+            ]
+        # renders on other threads skew the measurements
+        results = (
+            future.result()._replace(peak_rss=None, duration=None)
+            for future in futures
+        )
+
+    for result in results:
+        record_result(result, manifest, history)
+    manifest.save()
+    history.save()
 
     logging.info('Done.')
 
 
-def build_image(prov, rerender_all):
-    output_filename = join(
-        OUTPUT,
-        dir_for_thing(prov),
-        '{}.png'.format(prov.__module__.split('.')[-1])
-    )
+def build_image(prov):
+    """
+    Renders `prov`, measuring how long it takes and its peak memory use.
+    The `output` of the returned `RenderResult` is None if it couldn't be
+    rendered.
+    """
+    output_filename = output_for(prov)
     if exists(output_filename):
-        if not rerender_all:
-            return
-
         move_old(output_filename)
 
+    start = time.perf_counter()
+    with tracing.span(get_name(prov), 'render'):
+        with LeakCheck(get_name(prov)), PeakMemory() as memory:
+            rendered = render_image(prov, output_filename)
+
+    return RenderResult(
+        get_name(prov),
+        output_filename if rendered else None,
+        provider_inputs(prov) if rendered else [],
+        memory.peak,
+        time.perf_counter() - start
+    )
+
+
+def render_image(prov, output_filename):
+    """
+    Renders `prov` to `output_filename`, returning whether it was successful
+    """
     try:
-        logging.info('Building graph for %s', get_name(prov))
-        fig = prov.build_image()
-        logging.info('Rendering %s', get_name(prov))
-        try:
-            fig.savefig(output_filename)
-        except AttributeError:
-            fig.figure.savefig(output_filename)
-        plt.close('all')  # don't allow an old image to affect a new one
+        if not prov.has_required_data():
+            logging.info("Can't render %s; data is missing", get_name(prov))
+            return False
+
+        with profiling.provider(get_name(prov)):
+            logging.info('Building graph for %s', get_name(prov))
+            with profiling.phase('build_image'):
+                fig = prov.build_image()
+
+            logging.info('Rendering %s', get_name(prov))
+            with profiling.phase('savefig'):
+                # some providers return their axes rather than the figure
+                save_outputs(getattr(fig, 'figure', fig), output_filename)
+            plt.close('all')  # don't allow an old image to affect a new one
 
         if exists(output_filename):
             logging.info('Render successful')
+            return True
         else:
             logging.info('Render unsuccessful')
 
@@ -169,7 +389,106 @@ def build_image(prov, rerender_all):
             get_name(prov)
         )
 
-    del prov  # force cleanup
+    return False
+
+
+def plan(image_providers, workers):
+    """
+    Logs how `image_providers` would be shared between `workers` render
+    processes, and how long that's predicted to take, based on how long
+    each took to render last time
+    """
+    history = load_history()
+    cost = render_cost(history)
+
+    shards = assign_shards(image_providers, workers, cost)
+    for idx, shard in enumerate(shards, 1):
+        logging.info(
+            'Worker %d: %.1fs', idx, sum(map(cost, shard))
+        )
+        for prov in shard:
+            logging.info('    %6.1fs %s', cost(prov), get_name(prov))
+
+    logging.info(
+        'Predicted makespan with %d workers: %.1fs, '
+        'or %.1fs rendering in discovery order',
+        workers,
+        makespan(shards, cost),
+        makespan(
+            assign_shards(image_providers, workers, cost, False), cost
+        )
+    )
+
+    unknown = [
+        get_name(prov)
+        for prov in image_providers
+        if history.get(get_name(prov), 'duration') is None
+    ]
+    if unknown:
+        logging.warning(
+            'No render history for %s; assuming they take as long as the '
+            'slowest', ', '.join(unknown)
+        )
+
+
+def recording(iterable, into):
+    for item in iterable:
+        into.append(item)
+        yield item
+
+
+def watch(image_providers, services_container, shard=None, interval=1):
+    """
+    Re-renders any of `image_providers` whose sources or data change, using
+    the services loaded into this process, until interrupted. Changed
+    provider modules are reloaded before rendering.
+    """
+    # builds with render workers never loaded them into this process, and
+    # the first change shouldn't have to wait for them
+    logging.info('Loading services to watch with')
+    for name in required_services(image_providers, services_container):
+        getattr(services_container, name)
+
+    manifest = load_manifest(shard)
+    history = load_history(shard)
+    watcher = Watcher(manifest.fingerprinter)
+
+    def check(prov):
+        paths = watched_paths(prov, manifest, output_for(prov))
+        return watcher.changed(get_name(prov), paths)
+
+    for prov in image_providers:
+        check(prov)
+
+    logging.info('Watching %d image providers', len(image_providers))
+    try:
+        while True:
+            time.sleep(interval)
+
+            for idx, prov in enumerate(image_providers):
+                changed = check(prov)
+                if not changed:
+                    continue
+
+                logging.info(
+                    '%s changed: %s', get_name(prov), ', '.join(changed)
+                )
+                if changed & set(source_files(prov)):
+                    prov_cls = reload_provider(type(prov), changed)
+                    prov, = initialize_providers(
+                        [prov_cls], prov.services.container
+                    )
+                    image_providers[idx] = prov
+
+                record_result(build_image(prov), manifest, history)
+                manifest.save()
+                history.save()
+
+                # don't count the files written by the render as changes
+                check(prov)
+
+    except KeyboardInterrupt:
+        logging.info('No longer watching')
 
 
 def valid_thread_num(value):
@@ -188,7 +507,7 @@ def get_args():
     parser.add_argument(
         '-r', '--rerender',
         action='store_true',
-        help='Rerender all images'
+        help='Rerender all images, even those whose inputs are unchanged'
     )
     parser.add_argument(
         '-l', '--list',
@@ -207,24 +526,156 @@ def get_args():
         type=valid_thread_num,
         help='Number of image rendering threads'
     )
+    parser.add_argument(
+        '-w', '--workers',
+        action='store',
+        default=1,
+        type=valid_thread_num,
+        help='Number of image rendering processes; overrides --threads'
+    )
+    parser.add_argument(
+        '-m', '--memory-budget',
+        action='store',
+        type=parse_size,
+        help='Only start renders on the worker processes while their last '
+             'recorded peak memory use fits in this budget, eg; 8G'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        action='append',
+        default=[],
+        type=parse_output,
+        help='Also save each image in this format, optionally at a given '
+             'dpi, eg; pdf or png@300. May be given more than once'
+    )
+    parser.add_argument(
+        '--max-renders-per-worker',
+        action='store',
+        type=valid_thread_num,
+        help='Replace each worker process after it has rendered this many '
+             'images, to hand back whatever memory it has accumulated'
+    )
+    parser.add_argument(
+        '--max-worker-rss',
+        action='store',
+        type=parse_size,
+        help='Replace a worker process once its memory use is over this '
+             'size after a render, eg; 2G'
+    )
+    parser.add_argument(
+        '-s', '--shard',
+        action='store',
+        type=parse_shard,
+        help='Only build the given shard of the image providers, eg; 1/4. '
+             'Shards are balanced on previous render times, so the build '
+             'machines should share the same history.json, or --shard-history'
+    )
+    parser.add_argument(
+        '--shard-history',
+        action='store',
+        metavar='FILE',
+        help='Balance the shards on the render times in FILE, rather than '
+             'history.json; give every shard the same one'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Just predict how long rendering will take with the given '
+             'number of --workers, based on previous render times'
+    )
+    parser.add_argument(
+        '--preview',
+        action='store_true',
+        help='Quickly render low resolution previews, with simplified '
+             'geometry and sampled data, into a separate preview directory'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='After building, keep the services loaded and re-render images '
+             'as their sources or data change'
+    )
+    parser.add_argument(
+        '-p', '--profile',
+        action='store_true',
+        help='Time the phases of each image provider, writing a report to '
+             'profile.json in the output directory'
+    )
+    parser.add_argument(
+        '--trace',
+        action='store',
+        metavar='FILE',
+        help='Record a timeline of the build to FILE, which can be opened '
+             'in Perfetto or chrome://tracing'
+    )
+    parser.add_argument(
+        '--leak-check',
+        action='store_true',
+        help='Report the figures and axes left alive by each image '
+             'provider, and how much memory its render held on to'
+    )
     return parser.parse_args()
 
 
 def main():
+    if sys.argv[1:2] == ['cache']:
+        cache.main(sys.argv[2:], CACHE)
+        return
+
     args = get_args()
 
+    if args.profile:
+        profiling.enable()
+
+    if args.preview:
+        preview.enable()
+
+    if args.leak_check:
+        leaks.enable()
+
+    outputs.configure(args.output)
+
+    if args.trace:
+        tracing.enable()
+        tracing.name_process('saau')
+
     if args.list:
-        image_providers = load_image_providers(args.filter)
+        image_providers = select_providers(args)
         for ip in image_providers:
             logging.info(' * %s', get_name(ip))
 
+    elif args.plan:
+        plan(select_providers(args), args.workers)
+
     elif args.download_data:
         logging.info('Will only download data')
-        setup(args)
+        services_container = setup_services()
+        for _ in setup(args, services_container):
+            pass
 
     else:
-        image_providers = setup(args)
-        build_images(image_providers, args.rerender, args.threads)
+        # keep hold of the providers as they become ready, to watch them
+        image_providers = []
+        services_container = setup_services()
+        build_images(
+            recording(setup(args, services_container), image_providers),
+            args.rerender,
+            args.threads,
+            args.workers,
+            args.memory_budget,
+            args.shard,
+            args.max_renders_per_worker,
+            args.max_worker_rss
+        )
+
+        if args.watch:
+            watch(image_providers, services_container, args.shard)
+
+    if args.profile and not (args.list or args.plan):
+        profiling.report(join(output_root(), 'profile.json'))
+
+    if args.trace:
+        tracing.write(args.trace)
 
 
 if __name__ == '__main__':
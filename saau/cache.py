@@ -0,0 +1,220 @@
+"""
+Keeping the cache directory within a size budget, with
+`python -m saau cache stats` and `python -m saau cache gc --budget 20G`.
+
+Everything under the cache is sorted into kinds of artifact. Downloads and
+cassettes can't be remade without going back to the network, so they're
+never evicted. What can be made again from them is evicted once the cache is
+over budget: first the directories extracted from zips, then the derived
+pickles, memoized results and shared directories, each kind in order of
+when it was last used.
+
+Artifacts are touched as they're used, so their modification times double
+as their last use. The lock files left beside artifacts are removed by gc
+whenever no process holds them.
+"""
+import os
+import time
+import logging
+import argparse
+import shutil
+from os.path import join, exists, getsize, basename
+from collections import namedtuple, defaultdict
+
+import humanize
+
+from .utils import listdir_r
+from .utils.memory import parse_size
+from .utils.locking import remove_unheld_lock
+
+Artifact = namedtuple('Artifact', 'path,kind,size,used')
+
+DEFAULT_BUDGET = '20G'
+# the kinds of artifact that can be evicted, and in which order
+EVICTION_ORDER = {
+    'extracted': 0,
+    'memo': 1,
+    'pickle': 1,
+    'shared': 1,
+}
+# the names of the pickles made from downloads, such as landcover's cached
+# records; others, such as those saved with `save_json`, are downloaded data
+DERIVED_PICKLES = {'cached_records.pickle'}
+
+
+def directory_size(path):
+    return sum(getsize(filename) for filename in listdir_r(path))
+
+
+def classify_dir(path):
+    name = basename(path)
+    if exists(path + '.zip'):
+        return 'extracted'
+    if name.endswith('.shared'):
+        return 'shared'
+    if name == 'cassettes':
+        return 'cassettes'
+    return None
+
+
+def classify_file(path):
+    parent = basename(os.path.dirname(path))
+    if path.endswith('.lock'):
+        return 'lock'
+    if parent == '.memo':
+        return 'memo'
+    if basename(path) in DERIVED_PICKLES:
+        return 'pickle'
+    return 'download'
+
+
+def find_artifacts(root):
+    """
+    Yields each artifact under `root`, taking the directories that are
+    artifacts as a whole
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in list(dirnames):
+            path = join(dirpath, name)
+            kind = classify_dir(path)
+            if kind is not None:
+                dirnames.remove(name)
+                yield Artifact(
+                    path, kind, directory_size(path), os.stat(path).st_mtime
+                )
+
+        for name in filenames:
+            path = join(dirpath, name)
+            stat = os.stat(path)
+            yield Artifact(path, classify_file(path), stat.st_size,
+                           stat.st_mtime)
+
+
+def select_evictions(artifacts, budget):
+    """
+    The artifacts to evict to bring the total size of `artifacts` within
+    `budget`, if that's possible
+    """
+    total = sum(artifact.size for artifact in artifacts)
+    candidates = sorted(
+        (
+            artifact
+            for artifact in artifacts
+            if artifact.kind in EVICTION_ORDER
+        ),
+        key=lambda artifact: (EVICTION_ORDER[artifact.kind], artifact.used)
+    )
+
+    evictions = []
+    for artifact in candidates:
+        if total <= budget:
+            break
+        evictions.append(artifact)
+        total -= artifact.size
+
+    return evictions
+
+
+def remove(artifact):
+    if os.path.isdir(artifact.path):
+        shutil.rmtree(artifact.path, ignore_errors=True)
+    else:
+        os.remove(artifact.path)
+
+
+def stats(root):
+    sizes = defaultdict(int)
+    counts = defaultdict(int)
+    oldest = {}
+    for artifact in find_artifacts(root):
+        sizes[artifact.kind] += artifact.size
+        counts[artifact.kind] += 1
+        oldest[artifact.kind] = min(
+            oldest.get(artifact.kind, artifact.used), artifact.used
+        )
+
+    now = time.time()
+    for kind in sorted(sizes, key=sizes.get, reverse=True):
+        logging.info(
+            '%-10s %6d %10s  least recently used %s%s',
+            kind,
+            counts[kind],
+            humanize.naturalsize(sizes[kind]),
+            humanize.naturaltime(now - oldest[kind]),
+            '' if kind in EVICTION_ORDER else ' (kept)'
+        )
+    logging.info('%-10s %6d %10s', 'total', sum(counts.values()),
+                 humanize.naturalsize(sum(sizes.values())))
+
+
+def gc(root, budget, dry_run=False):
+    artifacts = list(find_artifacts(root))
+    evictions = select_evictions(artifacts, budget)
+
+    for artifact in evictions:
+        logging.info(
+            '%s %s (%s, %s)',
+            'Would evict' if dry_run else 'Evicting',
+            artifact.path,
+            artifact.kind,
+            humanize.naturalsize(artifact.size)
+        )
+        if not dry_run:
+            remove(artifact)
+
+    locks = [artifact for artifact in artifacts if artifact.kind == 'lock']
+    if dry_run:
+        logging.info('Would remove up to %d unheld locks', len(locks))
+    else:
+        removed = sum(
+            remove_unheld_lock(artifact.path) for artifact in locks
+        )
+        logging.info('Removed %d unheld locks', removed)
+
+    remaining = (
+        sum(artifact.size for artifact in artifacts) -
+        sum(artifact.size for artifact in evictions)
+    )
+    if remaining > budget:
+        logging.warning(
+            'Cache is %s, still over its budget of %s',
+            humanize.naturalsize(remaining), humanize.naturalsize(budget)
+        )
+
+    return evictions
+
+
+def get_args(argv):
+    parser = argparse.ArgumentParser(prog='saau cache')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    commands.add_parser('stats', help='Show what the cache holds')
+
+    gc_parser = commands.add_parser(
+        'gc',
+        help='Evict regenerable artifacts until the cache is within budget'
+    )
+    gc_parser.add_argument(
+        '--budget',
+        default=DEFAULT_BUDGET,
+        type=parse_size,
+        help='Size to bring the cache within, eg; 512M or 20G (default: {})'
+             .format(DEFAULT_BUDGET)
+    )
+    gc_parser.add_argument(
+        '-n', '--dry-run',
+        action='store_true',
+        help='Only list what would be evicted'
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv, root):
+    args = get_args(argv)
+
+    if args.command == 'stats':
+        stats(root)
+    else:
+        gc(root, args.budget, args.dry_run)
@@ -1,8 +1,12 @@
 import re
+import json
+from glob import glob
 from os import walk, makedirs, listdir, unlink
 from shutil import copyfile
-from os.path import join, basename, dirname
-from .__main__ import OUTPUT
+from os.path import join, basename, dirname, exists
+from .__main__ import OUTPUT, PREVIEW, CACHE
+from .history import merge_histories
+from .utils.locking import atomic_write
 
 
 FILENAME_RE = re.compile(r'[A-Za-z_]+\.png')
@@ -22,7 +26,43 @@ def get_filenames():
     )
 
 
+def merge_manifests(output=OUTPUT):
+    """
+    Merges the manifests written by sharded builds into the main manifest,
+    removing them once they're merged
+    """
+    filename = join(output, 'manifest.json')
+    merged = {}
+    if exists(filename):
+        with open(filename) as fh:
+            merged = json.load(fh)
+
+    shard_filenames = sorted(glob(join(output, 'manifest.shard-*.json')))
+    if not shard_filenames:
+        return merged
+
+    for shard_filename in shard_filenames:
+        print(shard_filename, '->', filename)
+        with open(shard_filename) as fh:
+            merged.update(json.load(fh))
+
+    with atomic_write(filename) as fh:
+        json.dump(merged, fh, indent=4, sort_keys=True)
+
+    # merged again later, they'd replace whatever's been rendered since
+    for shard_filename in shard_filenames:
+        unlink(shard_filename)
+
+    return merged
+
+
 def main():
+    for output in (OUTPUT, PREVIEW):
+        if exists(output):
+            merge_manifests(output)
+    for filename in ('history.json', 'history.preview.json'):
+        merge_histories(join(CACHE, filename))
+
     collated = join(dirname(OUTPUT), 'collated')
 
     for filename in listdir(collated):
@@ -0,0 +1,102 @@
+"""
+Measurements from previous renders of each image provider, such as their
+peak memory use, kept across runs to schedule future builds.
+
+Sharded builds each save what they measured to a history of their own,
+leaving the shared one as it was, which `saau.collect` then merges.
+"""
+import os
+import json
+import logging
+from glob import glob
+from os.path import exists
+
+from .utils.locking import atomic_write
+
+
+class BuildHistory(object):
+
+    def __init__(self, filename, save_as=None):
+        self.filename = filename
+        # only what's measured is saved elsewhere, to be merged later
+        self.save_as = save_as
+        self.measured = set()
+        self.providers = {}
+
+        if exists(filename):
+            try:
+                with open(filename) as fh:
+                    self.providers = json.load(fh)
+            except ValueError:
+                logging.warning('Discarding corrupt %s', filename)
+
+    def save(self):
+        if self.save_as is None:
+            filename, providers = self.filename, self.providers
+        else:
+            filename = self.save_as
+            # earlier builds of the same shard that haven't been merged yet
+            providers = BuildHistory(filename).providers
+            providers.update(
+                (name, self.providers[name]) for name in self.measured
+            )
+
+        with atomic_write(filename) as fh:
+            json.dump(providers, fh, indent=4, sort_keys=True)
+
+    def record(self, name, **measurements):
+        self.measured.add(name)
+        self.providers.setdefault(name, {}).update(
+            (key, value)
+            for key, value in measurements.items()
+            if value is not None
+        )
+
+    def get(self, name, key):
+        return self.providers.get(name, {}).get(key)
+
+    def estimate(self, name, key, default=0):
+        """
+        The last recorded `key` for `name`. Providers we've not measured yet
+        are pessimistically assumed to be as costly as the costliest we have.
+        """
+        value = self.get(name, key)
+        if value is not None:
+            return value
+
+        return max(
+            (
+                measurements[key]
+                for measurements in self.providers.values()
+                if key in measurements
+            ),
+            default=default
+        )
+
+
+def shard_filename(filename, shard):
+    return '{}.shard-{}-of-{}.json'.format(
+        os.path.splitext(filename)[0], *shard
+    )
+
+
+def merge_histories(filename):
+    """
+    Merges the histories saved by sharded builds into `filename`, removing
+    them once they're merged
+    """
+    history = BuildHistory(filename)
+    pattern = '{}.shard-*-of-*.json'.format(os.path.splitext(filename)[0])
+    shard_filenames = sorted(glob(pattern))
+
+    for shard_filename in shard_filenames:
+        measured = BuildHistory(shard_filename).providers
+        for name, measurements in measured.items():
+            history.record(name, **measurements)
+
+    if shard_filenames:
+        history.save()
+        for shard_filename in shard_filenames:
+            os.remove(shard_filename)
+
+    return history
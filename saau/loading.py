@@ -1,97 +1,183 @@
+"""
+Finding and loading the image providers declared in the `IMAGES` list of
+each package under `saau.sections`, and the services declared in the
+`SERVICES` list of each package under `saau.services`.
+
+Importing the sections pulls in cartopy, rasterio and friends, so those
+declarations are collected into providers.json ahead of time by running
+`python -m saau.loading`. Providers can then be listed and filtered without
+importing anything, and only those selected are imported.
+"""
+import json
 import logging
 import pkgutil
 import importlib
-from os.path import dirname, basename
+from os.path import dirname, join
 from fnmatch import fnmatch
+from functools import lru_cache
 
+from .utils import tracing
 
-def load_image_providers(filter_pattern):
+MANIFEST = join(dirname(__file__), 'providers.json')
+# the packages that declare each kind of provider
+KINDS = {'IMAGES': 'saau.sections', 'SERVICES': 'saau.services'}
+
+
+class ProviderEntry(object):
     """
-    Loads image providing modules in submodules of `sections`.
-    Said image providers are declared in an `IMAGES` list variable on the
-    submodule of `sections`
+    A provider as listed in providers.json, which stands in for its class
+    until it's loaded
     """
-    return load_providers(filter_pattern, 'IMAGES', 'saau.sections.')
 
+    def __init__(self, name, module, classname, required_services=None,
+                 service_name=None):
+        # as declared, eg; 'detailed.DetailedAgeImageProvider'
+        self.name = name
+        self.module = module
+        self.__name__ = classname
+        self.required_services = required_services
+        if service_name is not None:
+            self.service_name = service_name
 
-def load_service_providers(filter_pattern):
-    return load_providers(filter_pattern, 'SERVICES', 'saau.services.')
+    def __repr__(self):
+        return '<ProviderEntry {}.{}>'.format(self.module, self.__name__)
 
+    def load(self):
+        with tracing.span(self.module, 'import'):
+            module = importlib.import_module(self.module)
+        return getattr(module, self.__name__)
 
-def load_providers(filter_pattern, attr_name, package_name):
-    logging.info('Loading packages')
 
-    packages = pkgutil.walk_packages(
-        [dirname(__file__)],
-        prefix='saau.',
-        onerror=logging.error
-    )
+@lru_cache()
+def read_manifest(filename=MANIFEST):
+    with open(filename) as fh:
+        return json.load(fh)
 
-    packages = [
-        loader.find_module(name).load_module()
-        for loader, name, _ in packages
-        if name.startswith(package_name)
-    ]
 
-    top_level = [
-        package
-        for package in packages
-        if (
-            package.__name__.count('.') == 2 and
-            basename(package.__file__) == '__init__.py'
-        )
+def find_image_providers(filter_pattern):
+    return find_providers(filter_pattern, 'IMAGES')
+
+
+def find_service_providers(filter_pattern):
+    return find_providers(filter_pattern, 'SERVICES')
+
+
+def find_providers(filter_pattern, attr_name):
+    """
+    The entries for the providers declared in `attr_name` lists, whose
+    declarations match `filter_pattern`
+    """
+    entries = [
+        ProviderEntry(**entry)
+        for entry in read_manifest()[attr_name]
     ]
 
-    if not filter_pattern:
-        matcher = lambda _: True
-    else:
+    if filter_pattern:
         logging.info(
             "Filtering providers by \"%s\"",
             filter_pattern
         )
-        matcher = lambda prov: fnmatch(prov, filter_pattern)
+        entries = [
+            entry
+            for entry in entries
+            if fnmatch(entry.name, filter_pattern)
+        ]
 
-    def getter(package):
-        try:
-            return getattr(package, attr_name)
-        except AttributeError:
-            raise AttributeError(
-                "{} doesn't expose a {} attribute"
-                .format(package, attr_name)
-            )
+    return entries
 
-    image_providers = [
-        (package,) + tuple(image_provider.split('.'))
-        for package in top_level
-        for image_provider in getter(package)
-        if matcher(image_provider)
-    ]
 
-    logging.info('Loading image providers')
+def load_image_providers(filter_pattern):
+    """
+    Loads image providers declared in an `IMAGES` list variable on the
+    submodules of `sections`
+    """
+    return load_classes(find_image_providers(filter_pattern))
+
 
-    yield from load_classes(load_submodules(image_providers))
+def load_service_providers(filter_pattern):
+    return load_classes(find_service_providers(filter_pattern))
 
 
-def load_classes(modules):
-    for module, classname in modules:
+def load_classes(entries):
+    for entry in entries:
         try:
-            yield getattr(module, classname)
+            yield entry.load()
+        except ImportError:
+            logging.error("Couldn't load module \"%s\"", entry.module)
         except AttributeError:
             logging.error(
                 "Couldn't load class \"%s\"",
-                module.__name__ + '.' + classname
+                entry.module + '.' + entry.__name__
             )
 
 
-def load_submodules(image_providers):
-    for package, submodule, classname in image_providers:
+def declared_providers(attr_name, package_name):
+    """
+    Imports each package directly under `package_name` to find the providers
+    declared in its `attr_name` list, yielding their declaration, module and
+    class name
+    """
+    parent = importlib.import_module(package_name)
+    packages = pkgutil.iter_modules(parent.__path__, package_name + '.')
+
+    for info in sorted(packages, key=lambda info: info.name):
+        if not info.ispkg:
+            continue
+
+        package = importlib.import_module(info.name)
         try:
-            yield (
-                importlib.import_module('.' + submodule, package.__package__),
-                classname
-            )
-        except ImportError:
-            logging.error(
-                "Couldn't load module \"%s\"",
-                package.__package__ + '.' + submodule
+            declared = getattr(package, attr_name)
+        except AttributeError:
+            raise AttributeError(
+                "{} doesn't expose a {} attribute"
+                .format(package, attr_name)
             )
+
+        for provider in declared:
+            submodule, classname = provider.split('.')
+            module = info.name
+            if submodule != '__init__':
+                module += '.' + submodule
+            yield provider, module, classname
+
+
+def generate_manifest():
+    from .services import build_name
+
+    manifest = {}
+    for attr_name, package_name in KINDS.items():
+        entries = manifest[attr_name] = []
+
+        for name, module, classname in declared_providers(
+            attr_name, package_name
+        ):
+            # providers that can't be loaded are left out
+            for cls in load_classes([ProviderEntry(name, module, classname)]):
+                entry = {
+                    'name': name,
+                    'module': module,
+                    'classname': classname,
+                    'required_services': getattr(
+                        cls, 'required_services', None
+                    )
+                }
+                if attr_name == 'SERVICES':
+                    entry['service_name'] = build_name(cls)
+                entries.append(entry)
+
+    return manifest
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    manifest = generate_manifest()
+    with open(MANIFEST, 'w') as fh:
+        json.dump(manifest, fh, indent=4, sort_keys=True)
+        fh.write('\n')
+
+    logging.info('Wrote %s', MANIFEST)
+
+
+if __name__ == '__main__':
+    main()
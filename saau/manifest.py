@@ -0,0 +1,95 @@
+"""
+The build manifest records, for each rendered output, the files that went
+into it and a fingerprint of their contents. An output is only re-rendered
+once one of those inputs changes.
+"""
+import sys
+import json
+import logging
+from os.path import exists
+
+from .utils.fingerprint import Fingerprinter
+from .utils.sources import helper_files
+from .utils.locking import atomic_write
+
+
+def source_files(prov):
+    """
+    The source modules defining `prov`, including those of its base classes
+    """
+    return sorted({
+        sys.modules[cls.__module__].__file__
+        for cls in type(prov).__mro__
+        if cls.__module__.startswith('saau.')
+    })
+
+
+def service_inputs(services, seen=None):
+    """
+    The data paths and source of every service used through `services`,
+    following services that are themselves used by other services
+    """
+    seen = set() if seen is None else seen
+    paths = set()
+
+    for name in services.used - seen:
+        seen.add(name)
+        serv = services.container.services[name]
+        paths.update(source_files(serv))
+        paths.update(serv.accessed_paths)
+        paths.update(service_inputs(serv.services, seen))
+
+    return paths
+
+
+def provider_inputs(prov):
+    """
+    Every existing file that `prov` read while it was rendering, including
+    the source of the services and helpers it used
+    """
+    paths = set(source_files(prov))
+    paths.update(prov.accessed_paths)
+    paths.update(service_inputs(prov.services))
+    # the modules of the provider and its services are among its paths
+    paths.update(helper_files(paths))
+
+    return sorted(filter(exists, paths))
+
+
+class BuildManifest(object):
+
+    def __init__(self, filename, fingerprinter_cache):
+        self.filename = filename
+        self.fingerprinter = Fingerprinter(fingerprinter_cache)
+        self.outputs = {}
+
+        if exists(filename):
+            try:
+                with open(filename) as fh:
+                    self.outputs = json.load(fh)
+            except ValueError:
+                logging.warning('Discarding corrupt %s', filename)
+
+    def save(self):
+        with atomic_write(self.filename) as fh:
+            json.dump(self.outputs, fh, indent=4, sort_keys=True)
+        self.fingerprinter.save()
+
+    def is_fresh(self, output):
+        """
+        Whether `output` exists and none of its recorded inputs have changed
+        """
+        entry = self.outputs.get(output)
+        if entry is None or not exists(output):
+            return False
+
+        return (
+            self.fingerprinter.fingerprint(entry['inputs']) ==
+            entry['fingerprint']
+        )
+
+    def record(self, output, inputs):
+        self.outputs[output] = {
+            'inputs': inputs,
+            'fingerprint': self.fingerprinter.fingerprint(inputs)
+        }
@@ -0,0 +1,109 @@
+"""
+Saving a rendered figure in several formats and sizes at once, as set with
+`python -m saau --output`.
+
+Each image is always saved as a png at the figure's own dpi, which is what
+the manifest tracks, along with any extra outputs beside it. Every output
+goes through `savefig`, so they all follow the same savefig settings. As
+matplotlib isn't thread safe, they're drawn one at a time, but each extra
+png is drawn to memory and written out on another thread while the next is
+drawn.
+"""
+import logging
+from io import BytesIO
+from os.path import splitext
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from .utils import preview, profiling
+
+Output = namedtuple('Output', 'format,dpi')
+
+VECTOR_FORMATS = {'pdf', 'svg', 'eps', 'ps'}
+# the extra outputs to save each image as
+extra: List[Output] = []
+
+
+def configure(outputs):
+    extra[:] = outputs
+
+
+def parse_output(value):
+    """
+    Parses outputs such as 'pdf', 'png@300' or 'png@30'
+    """
+    fmt, _, dpi = value.lower().partition('@')
+
+    if fmt != 'png' and fmt not in VECTOR_FORMATS:
+        raise ValueError('Unsupported output format: {}'.format(fmt))
+
+    return Output(fmt, int(dpi) if dpi else None)
+
+
+def output_filename(primary, output):
+    """
+    Where `output` is saved, given the primary output's filename
+    """
+    name = splitext(primary)[0]
+    if output.dpi:
+        name = '{}-{}dpi'.format(name, output.dpi)
+    return '{}.{}'.format(name, output.format)
+
+
+def extra_filenames(primary):
+    """
+    The filenames of the extra outputs, which aren't made for previews
+    """
+    if preview.enabled:
+        return []
+    return [output_filename(primary, output) for output in extra]
+
+
+def render_png(figure, dpi):
+    """
+    Saves `figure` as a png at `dpi`, returning the encoded image
+    """
+    buf = BytesIO()
+    figure.savefig(buf, format='png', dpi=dpi)
+    return buf.getvalue()
+
+
+def write_file(filename, data):
+    with open(filename, 'wb') as fh:
+        fh.write(data)
+
+
+def save_outputs(figure, primary):
+    """
+    Saves `figure` to `primary` as a png, and to each of the extra outputs
+    """
+    dpi = preview.dpi() or figure.dpi
+    pngs = []
+
+    extras = [] if preview.enabled else extra
+    for output in extras:
+        filename = output_filename(primary, output)
+
+        if output.format == 'png':
+            pngs.append((filename, output.dpi or figure.dpi))
+        else:
+            logging.info('Saving %s', filename)
+            with profiling.phase('save_' + output.format):
+                figure.savefig(filename, dpi=output.dpi or dpi)
+
+    with ThreadPoolExecutor(1) as exe:
+        # only the png being written and the one just drawn are held at once
+        writing = None
+        for filename, png_dpi in pngs:
+            with profiling.phase('save_png'):
+                data = render_png(figure, png_dpi)
+            if writing is not None:
+                writing.result()
+            writing = exe.submit(write_file, filename, data)
+
+        # drawn while the last of the extra pngs is written
+        figure.savefig(primary, dpi=dpi)
+
+        if writing is not None:
+            writing.result()
@@ -2,10 +2,12 @@ import random
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 from ..image_provider import ImageProvider
+from ...utils.lazy import lazy_import
+
+sns = lazy_import('seaborn')
+plt = lazy_import('matplotlib.pyplot')
 
 
 STATES = np.array([
@@ -32,7 +34,6 @@ RANGES = np.array([
 ])
 
 random.seed(200)
-sns.set_style("whitegrid")
 
 
 def generate():
@@ -47,9 +48,11 @@ def generate():
 
 
 class DetailedAgeImageProvider(ImageProvider):
+    required_services = []
     has_required_data = lambda _: True
 
     def build_image(self):
+        sns.set_style("whitegrid")
         fig, ax = plt.subplots(nrows=2, ncols=1)
 
         data = pd.DataFrame(list(generate()))
@@ -1,19 +1,22 @@
 import logging
 from operator import itemgetter
 
-from matplotlib.cm import get_cmap
-import matplotlib as mpl
-import cartopy.crs as ccrs
-
 from ...utils.download.abs import get_generic_data, abs_data_to_dataframe
-from ..image_provider import ImageProvider
+from ..image_provider import ImageProvider, memoized
 from ...utils.header import render_header_to
+from ...utils.lazy import lazy_import
+
+mpl = lazy_import('matplotlib')
+cm = lazy_import('matplotlib.cm')
+ccrs = lazy_import('cartopy.crs')
 
 DATASETID = 'ABS_CENSUS2011_B02'
 FILENAME = 'median_ages.json'
 
 
 class MedianAgeImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts', 'sa3']
+    prepare_inputs = [FILENAME]
 
     def has_required_data(self):
         return self.data_dir_exists(FILENAME)
@@ -46,16 +49,17 @@ class MedianAgeImageProvider(ImageProvider):
     def region_lookup(self, sa3):
         return self.services.sa3.get('SA2_MAIN11', int(sa3))
 
-    def build_image(self):
-        colors = get_cmap('Purples')
+    @memoized(FILENAME)
+    def load_data(self):
+        return abs_data_to_dataframe(self.load_json(FILENAME))
 
-        age_data = abs_data_to_dataframe(self.load_json(FILENAME))
+    def prepare(self):
         age_data = [
             (
                 self.region_lookup(data_point.REGION),
                 data_point.Value
             )
-            for _, data_point in age_data.iterrows()
+            for _, data_point in self.load_data().iterrows()
         ]
 
         values = list(map(itemgetter(1), age_data))
@@ -69,14 +73,27 @@ class MedianAgeImageProvider(ImageProvider):
             max(values)
         )
 
-        aus_map = self.services.aus_map.get_map()
-        for shapes, mage in age_data:
-            aus_map.add_geometries(
+        regions = [
+            (
                 [
                     shape.geometry
                     for shape in shapes.rec
                     if shape.geometry
                 ],
+                mage
+            )
+            for shapes, mage in age_data
+        ]
+        return regions, norm
+
+    def draw(self, prepared):
+        regions, norm = prepared
+        colors = cm.get_cmap('Purples')
+
+        aus_map = self.services.aus_map.get_map()
+        for geometries, mage in regions:
+            aus_map.add_geometries(
+                geometries,
                 crs=ccrs.PlateCarree(),
                 color=colors(norm(mage))
             )
@@ -13,10 +13,11 @@ IMAGES = [
 
 from ..image_provider import ImageProvider
 from ...utils.download.abs import get_generic_data, abs_data_to_dataframe
+from ...utils.lazy import lazy_import
 
-from matplotlib.cm import get_cmap
-import matplotlib as mpl
-import cartopy.crs as ccrs
+mpl = lazy_import('matplotlib')
+cm = lazy_import('matplotlib.cm')
+ccrs = lazy_import('cartopy.crs')
 
 
 MAP = {
@@ -68,6 +69,11 @@ def get_data(country):
 
 
 class AncestryImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts', 'lga']
+
+    @property
+    def prepare_inputs(self):
+        return [self.filename]
 
     def has_required_data(self):
         return self.data_dir_exists(self.filename)
@@ -75,32 +81,48 @@ class AncestryImageProvider(ImageProvider):
     def obtain_data(self):
         return self.save_json(self.filename, get_data(self.ancestry_name))
 
-    def build_image(self):
+    def load_data(self):
         data = abs_data_to_dataframe(
             self.load_json(self.filename),
             ['ANCP', 'FREQUENCY']
         )
         data = data[data.pop('Time') == 2011]
         del data['REGIONTYPE']
+        return data
+
+    def prepare(self):
+        data = self.memoize(self.load_data, inputs=[self.filename])
 
         lga_lookup = lambda code: self.services.lga.get('LGA_CODE11', code)
 
-        aus_map = self.services.aus_map.get_map()
-        colors = get_cmap('Purples')
         norm = mpl.colors.Normalize(
             vmin=data.Value.min(),
             vmax=data.Value.max()
         )
-
-        for idx, loco in data.iterrows():
-            aus_map.add_geometries(
+        regions = [
+            (
                 [
                     shape.geometry
                     for shape in lga_lookup(loco.REGION).rec
                     if shape.geometry
                 ],
+                loco.Value
+            )
+            for idx, loco in data.iterrows()
+        ]
+        return regions, norm
+
+    def draw(self, prepared):
+        regions, norm = prepared
+
+        aus_map = self.services.aus_map.get_map()
+        colors = cm.get_cmap('Purples')
+
+        for geometries, value in regions:
+            aus_map.add_geometries(
+                geometries,
                 crs=ccrs.PlateCarree(),
-                color=colors(norm(loco.Value))
+                color=colors(norm(value))
             )
 
         return aus_map
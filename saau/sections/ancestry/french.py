@@ -7,10 +7,10 @@ class FrenchAncestryImageProvider(AncestryImageProvider):
     filename = 'french.json'
     ancestry_name = 'French'
 
-    def build_image(self):
+    def draw(self, prepared):
         return render_header_to(
             self.services.fonts.get_font(),
-            super().build_image(),
+            super().draw(prepared),
             19,
             lines=[
                 '<b>MAP</b>',
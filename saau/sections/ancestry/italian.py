@@ -7,10 +7,10 @@ class ItalianAncestryImageProvider(AncestryImageProvider):
     filename = 'italian.json'
     ancestry_name = 'Italian'
 
-    def build_image(self):
+    def draw(self, prepared):
         return render_header_to(
             self.services.fonts.get_font(),
-            super().build_image(),
+            super().draw(prepared),
             19,
             lines=[
                 '<b>MAP</b>',
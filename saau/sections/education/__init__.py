@@ -29,6 +29,7 @@ TYPP_MAP = {
 
 
 class EducationImageProvider(ImageProvider):
+    required_services = ['aus_map']
 
     def has_required_data(self):
         return self.data_dir_exists(self.filename)
@@ -2,17 +2,21 @@
 from glob import glob
 from os.path import basename, join
 
-import rasterio
-from cartopy.io import LocatedImage
-from cartopy.io import srtm
-import cartopy.crs as ccrs
 import numpy as np
-from rasterio.warp import reproject
 
 from ..image_provider import ImageProvider
 from ...utils.download import get_binary
 from ...utils import unzip
+from ...utils.profiling import phase
+from ...utils import preview
 from ...services.aus_map import AUS_NW, AUS_SE
+from ...utils.lazy import lazy_import
+
+rasterio = lazy_import('rasterio')
+warp = lazy_import('rasterio.warp')
+cartopy_io = lazy_import('cartopy.io')
+srtm = lazy_import('cartopy.io.srtm')
+ccrs = lazy_import('cartopy.crs')
 
 URL = 'http://www.ga.gov.au/corporate_data/48006/48006_shp.zip'
 FILENAME = basename(URL)
@@ -26,30 +30,21 @@ def load_data(self):
         yield rasterio.open(filename)
 
 
-def timer(func):
-    def wrapper(*args, **kwargs):
-        import time
-        start = time.time()
-        val = func(*args, **kwargs)
-        print(func.__name__, time.time() - start)
-        return val
-    return wrapper
-
-
 def fetch_raster(self):
     for bil in load_data(self):
         # read image into ndarray
         src = bil.read()
 
         dest = np.empty(shape=src.shape, dtype=np.uint8)
-        timer(reproject)(
-            src,
-            dest,
-            src_crs={'init': 'EPSG:4019'},
-            src_transform=bil.affine,
-            dst_crs={'init': 'EPSG:4326'},
-            dst_transform=bil.affine
-        )
+        with phase('reproject'):
+            warp.reproject(
+                src,
+                dest,
+                src_crs={'init': 'EPSG:4019'},
+                src_transform=bil.affine,
+                dst_crs={'init': 'EPSG:4326'},
+                dst_transform=bil.affine
+            )
 
         affine = bil.affine
         xmin = affine.c
@@ -57,7 +52,7 @@ def fetch_raster(self):
         ymin = affine.f + (affine.e * bil.height)
         ymax = affine.f
 
-        yield LocatedImage(
+        yield cartopy_io.LocatedImage(
             np.array(dest[0]),
             (xmin, xmax, ymin, ymax)
         )
@@ -71,10 +66,11 @@ def shade(located_elevations):
     """
     new_img = srtm.add_shading(located_elevations.image,
                                azimuth=135, altitude=15)
-    return LocatedImage(new_img, located_elevations.extent)
+    return cartopy_io.LocatedImage(new_img, located_elevations.extent)
 
 
 class ElevationImageProvider(ImageProvider):
+    required_services = ['aus_map']
 
     def has_required_data(self):
         return self.data_dir_exists(FILENAME)
@@ -99,12 +95,13 @@ class ElevationImageProvider(ImageProvider):
         )
 
         for img in images:
-            timer(ax.imshow)(
-                img.image,
-                origin='upper',
-                extent=img.extent,
-                transform=ccrs.PlateCarree()
-            )
+            with phase('imshow'):
+                ax.imshow(
+                    preview.downsample(img.image),
+                    origin='upper',
+                    extent=img.extent,
+                    transform=ccrs.PlateCarree()
+                )
         # ax.coastlines(resolution='50m', color='black', linewidth=1)
         # ax.gridlines()
         # 2014\05\09
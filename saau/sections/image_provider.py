@@ -1,38 +1,81 @@
+import os
+import sys
+import gzip
+import pickle
 import inspect
-import json
+import logging
+from functools import wraps, lru_cache
 from os.path import exists, join
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, List, Optional, Set, Union
 from abc import ABC, abstractmethod
 
-from ..services import Services
+from ..services import Services, required_services
+from ..manifest import source_files
+from ..utils.profiling import timed, phase
+from ..utils import not_implemented
+from ..utils.memo import Memo
+from ..utils.sources import helper_files
+from ..utils.formats import (
+    FORMATS, Format, search_order, json_equivalent, dumps_equal
+)
+from ..utils.data_manifest import DataManifest
+from ..utils.locking import atomic_path
 
 PathOrStr = Union[str, Path]
 
 
-def not_implemented():
-    frame = inspect.currentframe()
-    assert frame
-    frame_info = frame.f_back
-    assert frame_info
-    msg = ''
+@lru_cache()
+def prepare_code(cls):
+    """
+    The source that `cls.prepare` may depend on: the modules defining `cls`
+    and its bases, less their `draw` methods
+    """
+    sources = {}
+    for klass in cls.__mro__:
+        module = klass.__module__
+        if not module.startswith('saau.'):
+            continue
+        if module not in sources:
+            with open(sys.modules[module].__file__) as fh:
+                sources[module] = fh.read()
+        if 'draw' in vars(klass):
+            sources[module] = sources[module].replace(
+                inspect.getsource(vars(klass)['draw']), ''
+            )
 
-    if 'self' in frame_info.f_locals:
-        self = frame_info.f_locals['self']
-        try:
-            msg += self.__name__ + '#'  # for static/class methods
-        except AttributeError:
-            msg += self.__class__.__name__ + '.'
+    return ''.join(sources[module] for module in sorted(sources))
 
-    msg += frame_info.f_code.co_name + '()'
 
-    return NotImplementedError(msg)
+def memoized(*inputs):
+    """
+    Decorator form of `RequiresData.memoize`, for methods whose results only
+    depend on their arguments and the files `inputs` in the data_dir
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return self.memoize(
+                func.__get__(self), *args, inputs=inputs, **kwargs
+            )
+        return wrapper
+    return decorator
 
 
 class RequiresData(ABC):
+    # names of the services this uses, eg; ['aus_map', 'fonts']
+    required_services: Optional[List[str]] = []
+    # the most that memoized results may take up; see `memoize`
+    memo_max_size = 256 * 1024 ** 2
+    _memo: Optional[Memo] = None
+    # how `save_json` stores data; one of `saau.utils.formats.FORMATS`
+    data_format = 'pickle.gz'
+
     def __init__(self, data_dir: Path, services: Services) -> None:
         self.data_dir = data_dir
         self.services = services
+        # every path resolved in our data_dir; see `saau.manifest`
+        self.accessed_paths: Set[str] = set()
 
     @abstractmethod
     def has_required_data(self) -> bool:
@@ -41,23 +84,199 @@ class RequiresData(ABC):
     def obtain_data(self) -> bool:
         raise not_implemented()
 
+    @property
+    def memo(self) -> Memo:
+        if self._memo is None:
+            self._memo = Memo(join(self.data_dir, '.memo'), self.memo_max_size)
+        return self._memo
+
+    def memoize(self, func, *args, inputs=(), services=(), code=None,
+                **kwargs):
+        """
+        Calls `func` with `args` and `kwargs`, or reuses its result from an
+        earlier render if neither they, the files `inputs` in the data_dir,
+        the data and source of the `services` it uses, nor its `code` have
+        changed since. Unless given, its code is the module defining it.
+        Either way, the helpers this and the services import are included.
+        """
+        paths = {self.data_path(name) for name in inputs}
+        sources = set(source_files(self))
+        for name in services:
+            serv = getattr(self.services, name)
+            paths.update(serv.accessed_paths)
+            paths.update(source_files(serv))
+            sources.update(source_files(serv))
+        paths.update(helper_files(sources))
+
+        name = '{}.{}'.format(type(self).__qualname__, func.__qualname__)
+        return self.memo.call(name, func, args, kwargs, sorted(paths), code)
+
     def data_dir_exists(self, name: PathOrStr) -> bool:
-        return exists(self.data_dir_join(name))
+        return exists(self.data_path(name))
 
     def data_dir_join(self, name: PathOrStr) -> str:
-        return join(self.data_dir, name)
+        path = join(self.data_dir, name)
+        self.accessed_paths.add(path)
+        return path
+
+    @property
+    def data_manifest(self) -> DataManifest:
+        return DataManifest(self.data_dir)
+
+    def is_valid_data(self, name: PathOrStr, data: Any) -> bool:
+        """
+        Whether `data`, as saved or loaded with `name`, is usable
+        """
+        return True
+
+    def has_valid_data(self, name: PathOrStr) -> bool:
+        """
+        Whether `name` exists and is valid. Its status is recorded in the
+        data manifest when it's saved, so it only needs loading to validate
+        it again if it's changed since.
+        """
+        path = self.data_path(name)
+        valid = self.data_manifest.status(path)
+        if valid is not None:
+            return valid
+        if not exists(path):
+            return False
+
+        try:
+            valid = self.is_valid_data(name, self.load_json(name))
+        except (ValueError, EOFError, pickle.UnpicklingError,
+                gzip.BadGzipFile):
+            valid = False
+
+        # loading may have migrated it
+        self.data_manifest.record(self.data_path(name), valid)
+        return valid
+
+    def data_path(self, name: PathOrStr) -> str:
+        """
+        The path that `name` is stored at, in whichever format it was saved
+        in, or where it would be if it were saved as is
+        """
+        for fmt in search_order(self.data_format):
+            path = join(self.data_dir, str(name) + fmt.suffix)
+            if exists(path):
+                break
+        else:
+            path = join(self.data_dir, name)
+
+        self.accessed_paths.add(path)
+        return path
 
     def save_json(self, name: PathOrStr, data: Any) -> bool:
-        with open(self.data_dir_join(name), 'w') as fh:
-            json.dump(data, fh, indent=4)
+        """
+        Saves `data` as `name` in our `data_format`, replacing any copy of it
+        in another format. Whatever the format, the data is loaded back as
+        it would be from json.
+        """
+        fmt = FORMATS[self.data_format]
+        self.store(name, json_equivalent(data), fmt)
+
+        for other in FORMATS.values():
+            if other is not fmt:
+                try:
+                    os.remove(join(self.data_dir, str(name) + other.suffix))
+                except FileNotFoundError:
+                    pass
         return True
 
+    def store(self, name: PathOrStr, data: Any, fmt: Format) -> str:
+        path = self.data_dir_join(str(name) + fmt.suffix)
+        with atomic_path(path) as staging:
+            fmt.dump(data, staging)
+        self.data_manifest.record(path, self.is_valid_data(name, data))
+        return path
+
+    def migrate(self, name: PathOrStr, data: Any) -> None:
+        """
+        Stores `data`, loaded from another format, in our `data_format`. The
+        original is kept, as only an explicit `save_json` replaces it.
+        """
+        fmt = FORMATS[self.data_format]
+        try:
+            path = self.store(name, data, fmt)
+            # compared serialised, as NaN isn't equal to itself
+            if dumps_equal(fmt.load(path), data):
+                return
+            os.remove(path)
+        except Exception as e:
+            logging.warning('Migrating %s failed: %s', name, e)
+        else:
+            logging.warning('Migrating %s changed its data', name)
+
+    @timed('load_data')
     def load_json(self, name: PathOrStr) -> Any:
-        with open(self.data_dir_join(name)) as fh:
-            return json.load(fh)
+        path = self.data_path(name)
+        fmt = next(
+            fmt for fmt in search_order(self.data_format)
+            if path == join(self.data_dir, str(name) + fmt.suffix)
+        )
+        data = fmt.load(path)
+
+        if fmt is not FORMATS[self.data_format]:
+            logging.info('Migrating %s to %s', path, self.data_format)
+            self.migrate(name, data)
+
+        return data
 
 
 class ImageProvider(RequiresData):
-    @abstractmethod
-    def build_image(self) -> str:
+    # unless they say otherwise, image providers may use any service
+    required_services: Optional[List[str]] = None
+    # the files in the data_dir that `prepare` reads
+    prepare_inputs: List[str] = []
+
+    def build_image(self) -> Any:
+        """
+        Renders the image, returning the figure or axes it was drawn on.
+        Providers either override this, or implement `prepare` and `draw`.
+        """
+        prepared = self.prepared()
+        with phase('draw'):
+            return self.draw(prepared)
+
+    def prepare(self) -> Any:
+        """
+        Loads and joins up everything the image is drawn from, such as its
+        geometries, their values and the norm to colour them by.
+
+        The result is cached against the data in `prepare_inputs`, that of
+        the `required_services`, and the source of this provider less its
+        `draw` method, so that changing how the image is drawn doesn't
+        prepare it again.
+        """
+        raise not_implemented()
+
+    def draw(self, prepared: Any) -> Any:
+        """
+        Draws the image from what `prepare` returned
+        """
         raise not_implemented()
+
+    def prepared(self) -> Any:
+        with phase('prepare'):
+            return self.memoize(
+                self.prepare,
+                inputs=self.prepare_inputs,
+                # those needing all services depend on all their data
+                services=required_services(
+                    [self], getattr(self.services, 'container', self.services)
+                ),
+                code=prepare_code(type(self))
+            )
+
+
+def implements_rendering(cls) -> bool:
+    """
+    Whether `cls` overrides `build_image`, or both `prepare` and `draw`
+    """
+    def overrides(name):
+        return getattr(cls, name) is not getattr(ImageProvider, name)
+
+    return overrides('build_image') or (
+        overrides('prepare') and overrides('draw')
+    )
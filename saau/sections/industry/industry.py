@@ -2,11 +2,13 @@ from os.path import basename, splitext
 
 import pandas
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 
 from ..image_provider import ImageProvider
 from ...utils.download import get_abs_csv
+from ...utils.lazy import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+mpatches = lazy_import('matplotlib.patches')
 
 url = (
     'http://www.ausstats.abs.gov.au/Ausstats/subscriber.nsf/'
@@ -75,6 +77,7 @@ COLORS = [
 
 
 class IndustryImageProvider(ImageProvider):
+    required_services = ['lga']
 
     def has_required_data(self):
         return self.data_dir_exists(filename)
@@ -5,8 +5,10 @@ from os.path import join, exists, basename
 from tqdm import tqdm
 
 from ..image_provider import ImageProvider
+from ...utils import touch
 from ...utils.shape import shape_from_zip
 from ...utils.download import get_binary
+from ...utils.locking import atomic_write, file_lock
 
 DATA_URLS = [
     "http://data.daff.gov.au/data/warehouse/lusag4l___001/SA_shape.zip",
@@ -30,13 +32,15 @@ def have_cached(data_dir):
 
 def load_from_cache(data_dir):
     filename = join(data_dir, CACHE_FILENAME)
+    # marks it as recently used; see `saau.cache`
+    touch(filename)
     with open(filename, 'rb') as fh:
         return pickle.load(fh)
 
 
 def cache_data(data_dir, data):
     filename = join(data_dir, CACHE_FILENAME)
-    with open(filename, 'wb') as fh:
+    with atomic_write(filename, 'wb') as fh:
         pickle.dump(data, fh)
     return data
 
@@ -70,7 +74,7 @@ def load_from_zips(data_dir):
             )
 
 
-def load_data(data_dir):
+def try_load_from_cache(data_dir):
     if have_cached(data_dir):
         logging.info('Loading from cache')
         try:
@@ -79,8 +83,21 @@ def load_data(data_dir):
             return v
         except EOFError:
             logging.info('Failed to load from cache, loading from zip')
+    return None
+
+
+def load_data(data_dir):
+    cached = try_load_from_cache(data_dir)
+    if cached is not None:
+        return cached
+
+    # only one process loads the zips, while the others wait for its cache
+    with file_lock(join(data_dir, CACHE_FILENAME)):
+        cached = try_load_from_cache(data_dir)
+        if cached is not None:
+            return cached
 
-    return cache_data(data_dir, list(load_from_zips(data_dir)))
+        return cache_data(data_dir, list(load_from_zips(data_dir)))
     # frames = [
     #     pandas.DataFrame.from_records(
     #         dict(record.attributes, geom=geom)
@@ -94,6 +111,7 @@ def load_data(data_dir):
 
 
 class LandcoverImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts']
 
     def has_required_data(self):
         return all(map(self.data_dir_exists, FILENAMES))
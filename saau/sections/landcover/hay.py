@@ -1,9 +1,11 @@
 import logging
 
-import cartopy.crs as ccrs
-
 from .data import LandcoverImageProvider, load_data
 from ...utils.header import render_header_to
+from ...utils import preview
+from ...utils.lazy import lazy_import
+
+ccrs = lazy_import('cartopy.crs')
 
 ALUM = {'3.3.3 Hay & silage', '3.3.3'}
 
@@ -21,7 +23,7 @@ class HayImageProvider(LandcoverImageProvider):
         data = load_data(self.data_dir)
 
         data = filter(key, data)
-        data = list(data)
+        data = preview.sample(data)
 
         logging.info('%d data thingies for hay', len(data))
 
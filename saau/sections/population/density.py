@@ -1,82 +1,26 @@
-import json
 import logging
-from os.path import join
-
-import matplotlib as mpl
-import cartopy.crs as ccrs
-from matplotlib.cm import get_cmap
 
 from ...utils.download.abs import get_generic_data, abs_data_to_dataframe
 from ..image_provider import ImageProvider
 from ...utils.header import render_header_to
+from ...utils.lazy import lazy_import
 
-filename = 'ABS_ANNUAL_ERP_LGA2014.json'
-
-
-def get_data(data_dir):
-    with open(join(data_dir, filename)) as fh:
-        return abs_data_to_dataframe(json.load(fh))
-
-
-def main(services, data_dir):
-    logging.info('loading data')
-    dat = get_data(data_dir)
-
-    norm = mpl.colors.Normalize(
-        vmin=dat.Value.min(),
-        vmax=546067  # has an outlier
-    )
-    cmap = get_cmap('hot_r')
-
-    logging.info('building map')
-
-    aus_map = services.aus_map.get_map()
-
-    logging.info('Adding data')
-    for _, row in dat.iterrows():
-        recs = services.lga.get('LGA_CODE11', row.LGA2014)
-
-        aus_map.add_geometries(
-            [rec.geometry for rec in recs.rec],
-            crs=ccrs.PlateCarree(),
-            facecolor=cmap(norm(row.Value)),
-            edgecolor='grey'
-        )
+mpl = lazy_import('matplotlib')
+cm = lazy_import('matplotlib.cm')
+ccrs = lazy_import('cartopy.crs')
 
-    left, bottom, width, height = 0.90, 0.2, 0.02, 0.6
-    cax = aus_map.figure.add_axes([left, bottom, width, height])
-    cb = mpl.colorbar.ColorbarBase(
-        cax,
-        cmap=cmap,
-        norm=norm,
-        spacing='props'
-    )
-    cb.set_label('Population')
-
-    return render_header_to(
-        services.fonts.get_font(),
-        aus_map,
-        19.5,
-        [
-            '<b>MAP</b>',
-            'SHOWING THE FIVE DEGREES OF DENSITY, THE DISTRIBUTION',
-            '<b>OF</b>',
-            'POPULATION',
-            '<i>'
-            'Compiled using estimates from the Australian Bureau of Statistics'
-            '</i>'
-        ]
-    )
+filename = 'ABS_ANNUAL_ERP_LGA2014.json'
 
 
 class PopulationDensityImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts', 'lga']
+    prepare_inputs = [filename]
 
-    def has_required_data(self):
-        if not self.data_dir_exists(filename):
-            return False
+    def is_valid_data(self, name, data):
+        return bool(data)
 
-        with open(self.data_dir_join(filename)) as fh:
-            return bool(fh.read())
+    def has_required_data(self):
+        return self.has_valid_data(filename)
 
     def obtain_data(self):
         data = get_generic_data(
@@ -89,5 +33,71 @@ class PopulationDensityImageProvider(ImageProvider):
         )
         return self.save_json(filename, data)
 
-    def build_image(self):
-        return main(self.services, self.data_dir)
+    def get_data(self):
+        return abs_data_to_dataframe(self.load_json(filename))
+
+    def prepare(self):
+        logging.info('loading data')
+        dat = self.get_data()
+
+        norm = mpl.colors.Normalize(
+            vmin=dat.Value.min(),
+            vmax=546067  # has an outlier
+        )
+
+        regions = [
+            (
+                [
+                    rec.geometry
+                    for rec in self.services.lga.get(
+                        'LGA_CODE11', row.LGA2014
+                    ).rec
+                ],
+                row.Value
+            )
+            for _, row in dat.iterrows()
+        ]
+        return regions, norm
+
+    def draw(self, prepared):
+        regions, norm = prepared
+        cmap = cm.get_cmap('hot_r')
+
+        logging.info('building map')
+
+        aus_map = self.services.aus_map.get_map()
+
+        logging.info('Adding data')
+        for geometries, value in regions:
+            aus_map.add_geometries(
+                geometries,
+                crs=ccrs.PlateCarree(),
+                facecolor=cmap(norm(value)),
+                edgecolor='grey'
+            )
+
+        left, bottom, width, height = 0.90, 0.2, 0.02, 0.6
+        cax = aus_map.figure.add_axes([left, bottom, width, height])
+        cb = mpl.colorbar.ColorbarBase(
+            cax,
+            cmap=cmap,
+            norm=norm,
+            spacing='props'
+        )
+        cb.set_label('Population')
+
+        return render_header_to(
+            self.services.fonts.get_font(),
+            aus_map,
+            19.5,
+            [
+                '<b>MAP</b>',
+                'SHOWING THE FIVE DEGREES OF DENSITY, THE DISTRIBUTION',
+                '<b>OF</b>',
+                'POPULATION',
+                '<i>'
+                'Compiled using estimates from the Australian Bureau of '
+                'Statistics'
+                '</i>'
+            ]
+        )
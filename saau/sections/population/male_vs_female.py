@@ -7,13 +7,14 @@ ASGS 2013  MetaData : ERP by LGA (ASGS 2013)
 
 import logging
 
-import cartopy.crs as ccrs
-from matplotlib import patches as mpatches
-from matplotlib.colors import ListedColormap
-
-from ..image_provider import ImageProvider
+from ..image_provider import ImageProvider, memoized
 from ...utils.download.abs import get_generic_data, abs_data_to_dataframe
 from ...utils.header import render_header_to
+from ...utils.lazy import lazy_import
+
+ccrs = lazy_import('cartopy.crs')
+mpatches = lazy_import('matplotlib.patches')
+colors = lazy_import('matplotlib.colors')
 
 FILENAME = 'gendered_populations.csv'
 SEXES = ['Males', 'Females']
@@ -26,10 +27,10 @@ COLOR_RANGE_HEX = [
     '#CC8A6E',
     '#B03F41'
 ]
-COLOR_RANGE = ListedColormap(COLOR_RANGE_HEX, 'MaleVSFemale')
 
 
 class MaleVSFemaleImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts', 'lga']
 
     def has_required_data(self):
         return self.data_dir_exists(FILENAME)
@@ -48,6 +49,7 @@ class MaleVSFemaleImageProvider(ImageProvider):
         )
         return self.save_json(FILENAME, data)
 
+    @memoized(FILENAME)
     def load_data(self):
         df = abs_data_to_dataframe(self.load_json(FILENAME))
 
@@ -80,10 +82,11 @@ class MaleVSFemaleImageProvider(ImageProvider):
 
         logging.info('Adding data for %d towns to map', len(data))
 
+        color_range = colors.ListedColormap(COLOR_RANGE_HEX, 'MaleVSFemale')
         for cl, pc_diff in data:
             aus_map.add_geometries(
                 [d.geometry for d in cl.rec],
-                facecolor=COLOR_RANGE(pc_diff),
+                facecolor=color_range(pc_diff),
                 edgecolor='grey',
                 linewidth=0.125,
                 crs=ccrs.PlateCarree(),
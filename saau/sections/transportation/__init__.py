@@ -1,12 +1,12 @@
-import os
-import json
 from typing import List
 
-import cartopy.crs as ccrs
-import shapely.geometry as sgeom
-
 from ..image_provider import ImageProvider
+from ...utils import preview
 from .data import get_paths
+from ...utils.lazy import lazy_import
+
+ccrs = lazy_import('cartopy.crs')
+sgeom = lazy_import('shapely.geometry')
 
 
 def build_from_paths(services, paths):
@@ -15,7 +15,7 @@ def build_from_paths(services, paths):
     LineString = sgeom.LineString
     paths = [
         LineString(tuple(map(tuple, waypoints)))
-        for waypoints in paths
+        for waypoints in preview.sample(paths)
     ]
 
     aus_map.add_geometries(
@@ -33,6 +33,7 @@ def build_from_paths(services, paths):
 
 
 class TransportationImageProvider(ImageProvider):
+    required_services = ['aus_map', 'fonts']
     path: str
     layers: List[str]
 
@@ -48,20 +49,12 @@ class TransportationImageProvider(ImageProvider):
             get_paths(self.layers).tolist()
         )
 
+    def is_valid_data(self, name, data):
+        # ensure there's actually something in the file
+        return bool(data)
+
     def has_required_data(self):
-        if not self.data_dir_exists(self.path):
-            return False
-
-        # some extra validation
-        filename = self.data_dir_join(self.path)
-        try:
-            # ensure there's actually something in the file
-            with open(filename) as fh:
-                return bool(json.load(fh))
-        except ValueError:
-            # if the file doesn't contain valid json, remove it
-            os.unlink(filename)
-            return False
+        return self.has_valid_data(self.path)
 
     def build_image(self):
         return build_from_paths(
@@ -5,10 +5,6 @@ from typing import List
 import cgi
 from urllib.parse import parse_qs
 
-from ...utils.py3_hook import with_hook
-
-with with_hook():
-    from arcrest import Catalog
 import numpy as np
 
 
@@ -29,6 +25,11 @@ def mend_extent(extent):
 
 
 def get_data(requested_layers: List[str]):
+    # arcrest is converted with 2to3 as it's imported, which is slow
+    from ...utils.py3_hook import with_hook
+    with with_hook():
+        from arcrest import Catalog
+
     catalog = Catalog('http://services.ga.gov.au/site_7/rest/services')
     service = catalog['NM_Transport_Infrastructure']
     layers = get_layers(service)
@@ -1,6 +1,8 @@
 import re
+from threading import RLock
+from collections import defaultdict
 from ..utils import get_name
-from typing import Any, Dict
+from typing import Any, Callable, DefaultDict, Dict, Iterable, Optional, Set
 
 
 def build_name(serv):
@@ -21,20 +23,109 @@ def build_name(serv):
 
 
 class Services(object):
+    """
+    Holds the services available to providers.
+
+    Services are either injected ready-made, or registered as classes or
+    the entries that load them, in which case they are only created by
+    `factory` (which also obtains their data) the first time they are
+    accessed.
+    """
     services: Dict[str, Any]
+    registered: Dict[str, Any]
+    locks: DefaultDict[str, RLock]
+
+    def __init__(
+        self,
+        factory: Optional[Callable[[Any, 'Services'], Any]] = None
+    ):
+        self.services = {}
+        self.registered = {}
+        self.factory = factory
+        # services are created under their own lock, so that obtaining
+        # the data for one doesn't hold up the others
+        self.lock = RLock()
+        self.locks = defaultdict(RLock)
 
     def __repr__(self):
         return '<Services times {}>'.format(len(self.services))
 
+    def tracked(self):
+        return TrackedServices(self)
+
     def inject(self, services):
-        self.services = {build_name(serv): serv for serv in services}
+        self.services.update(
+            (build_name(serv), serv) for serv in services
+        )
+
+    def register(self, services):
+        self.registered.update(
+            (build_name(serv), serv) for serv in services
+        )
+
+    def names(self) -> Set[str]:
+        return set(self.registered) | set(self.services)
 
     def __getattr__(self, name):
-        try:
-            # if it's not already an attribute,
-            # look it up and cache it
+        if name in {'services', 'registered', 'factory', 'lock', 'locks'}:
+            # not yet initialised, such as when unpickling
+            raise AttributeError(name)
+
+        if name not in self.services and name not in self.registered:
+            raise AttributeError(name)
+
+        with self.lock:
+            lock = self.locks[name]
+
+        with lock:
+            if name not in self.services:
+                self.services[name] = self.factory(self.registered[name], self)
+
+            # if it's not already an attribute, cache it
             value = self.services[name]
             setattr(self, name, value)
             return value
-        except KeyError:
-            raise AttributeError(name)
+
+
+def required_services(provs: Iterable[Any], services: Services) -> Set[str]:
+    """
+    Determines the names of the services `provs` need, including those the
+    services themselves need. Providers that don't declare their
+    `required_services` are assumed to need all of them.
+    """
+    needed: Set[str] = set()
+    pending = list(provs)
+
+    while pending:
+        names = getattr(pending.pop(), 'required_services', None)
+        if names is None:
+            names = services.names()
+
+        for name in set(names) - needed:
+            needed.add(name)
+            serv = services.registered.get(name, services.services.get(name))
+            if serv is not None:
+                pending.append(serv)
+
+    return needed
+
+
+class TrackedServices(object):
+    """
+    A view onto a `Services` container that records which services are used
+    through it
+    """
+    used: Set[str]
+
+    def __init__(self, container):
+        self.container = container
+        self.used = set()
+
+    def __repr__(self):
+        return '<TrackedServices of {!r}>'.format(self.container)
+
+    def __getattr__(self, name):
+        value = getattr(self.container, name)
+        if name in self.container.services:
+            self.used.add(name)
+        return value
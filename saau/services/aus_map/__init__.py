@@ -1,14 +1,17 @@
 import logging
 from collections import namedtuple
-import pickle
-from os.path import basename
-
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
+from os.path import basename, join
 
 from ...utils.shape import shape_from_zip
 from ...sections.image_provider import RequiresData
 from ...utils.download import get_binary
+from ...utils.profiling import timed
+from ...utils import preview
+from ...utils.lazy import lazy_import
+from ...utils.shared import shared
+
+plt = lazy_import('matplotlib.pyplot')
+ccrs = lazy_import('cartopy.crs')
 
 name = lambda q: q.attributes['NAME_1']
 DummyRecord = namedtuple('DummyRecord', 'attributes,geometry')
@@ -24,38 +27,29 @@ FILENAME = basename(URL)
 
 
 def get_states(services):
-    geometries_cache = services.aus_map.data_dir_join('geometries.pickle')
+    source = services.aus_map.data_dir_join(FILENAME)
 
-    try:
-        with open(geometries_cache, 'rb') as fh:
-            return pickle.load(fh)
+    def build():
+        shpfile = shape_from_zip(source, "AUS_adm1")
 
-    except (FileNotFoundError, EOFError):
-        pass
+        return [
+            DummyRecord(
+                rec.attributes,
+                rec.geometry.simplify(0.5)
+            )
+            for rec in shpfile.records()
+        ], None
 
-    shpfile = shape_from_zip(
-        services.aus_map.data_dir_join(FILENAME),
-        "AUS_adm1"
-    )
-
-    val = list(shpfile.records())
-
-    val = [
-        DummyRecord(
-            rec.attributes,
-            rec.geometry.simplify(0.5)
-        )
-        for rec in val
-    ]
-
-    with open(geometries_cache, 'wb') as fh:
-        pickle.dump(val, fh)
-
-    return val
+    # the simplified states are shared between processes
+    path = join(services.aus_map.data_dir, 'states.shared')
+    return shared(path, source, build).records
 
 
 def get_map(services, show_world=False, zorder=0):
     ax = plt.axes([0, 0, 1, 1], projection=ccrs.Mercator())
+    ax.add_geometries = timed('add_geometries')(
+        preview.simplified(ax.add_geometries)
+    )
 
     change = lambda x: (x / 100) * 2
 
@@ -1,10 +1,11 @@
 from os.path import join, exists
 
-from matplotlib import font_manager
-
 from ...sections.image_provider import RequiresData
 from ...utils.download import get_binary
 from ...utils import unzip
+from ...utils.lazy import lazy_import
+
+font_manager = lazy_import('matplotlib.font_manager')
 
 
 SERVICES = ['__init__.FontProvider']
@@ -28,12 +29,14 @@ class FontProvider(RequiresData):
 
     def obtain_data(self):
         filename = self.data_dir_join(self.FILENAME + ".zip")
-        res = get_binary(
-            'http://dl.dafont.com/dl/?f=hand_shop_typography_c30',
-            filename
-        )
-        if not res:
-            return res
+        # the extracted font may only have been evicted from the cache
+        if not exists(filename):
+            res = get_binary(
+                'http://dl.dafont.com/dl/?f=hand_shop_typography_c30',
+                filename
+            )
+            if not res:
+                return res
 
         unzip(filename)
 
@@ -1,14 +1,14 @@
 import struct
 from functools import reduce
-from os.path import basename, splitext
-from functools import lru_cache
+from os.path import basename, splitext, join
 
 import pandas
-import dill as pickle
 
 from ...sections.image_provider import RequiresData
 from ...utils.shape import shape_from_zip
 from ...utils.download import get_binary, get_abs_csv
+from ...utils.profiling import timed
+from ...utils.shared import shared
 
 DYNAMIC_TABLE = {
     'STATE_NAME_2011': 'state_name',
@@ -111,13 +111,14 @@ class LocationConversion(RequiresData):
     def __init__(self, data_dir, services):
         assert data_dir, __import__('ipdb').set_trace()
         super().__init__(data_dir, services)
+        self._reference = None
 
-    @lru_cache()
     def load_reference(self):
-        import pandas
-        filenames = map(self.data_dir_join, self.filenames)
-        frames = map(pandas.read_csv, filenames)
-        return pandas.concat(list(frames), ignore_index=True)
+        if self._reference is None:
+            filenames = map(self.data_dir_join, self.filenames)
+            frames = map(pandas.read_csv, filenames)
+            self._reference = pandas.concat(list(frames), ignore_index=True)
+        return self._reference
 
     def has_required_data(self):
         return all(map(self.data_dir_exists, self.filenames))
@@ -174,6 +175,7 @@ class RegionClassification(RequiresData):
     def __init__(self, data_dir, services):
         super().__init__(data_dir, services)
         self.filename = basename(self.url)
+        self._reference = None
 
     def has_required_data(self):
         return self.data_dir_exists(self.filename)
@@ -184,9 +186,27 @@ class RegionClassification(RequiresData):
             self.data_dir_join(self.filename)
         )
 
-    @lru_cache()
     def load_reference(self):
-        shpfile = shape_from_zip(self.data_dir_join(self.filename))
+        if self._reference is None:
+            self._reference = self.build_reference()
+        return self._reference
+
+    @timed('load_reference')
+    def build_reference(self):
+        source = self.data_dir_join(self.filename)
+
+        def build():
+            ref = self.read_reference(source)
+            return ref.pop('rec').tolist(), ref
+
+        # the records and their attributes are shared between processes
+        path = join(self.data_dir, self.filename + '.shared')
+        records, ref = shared(path, source, build)
+        ref['rec'] = records
+        return ref
+
+    def read_reference(self, source):
+        shpfile = shape_from_zip(source)
         try:
             return pandas.DataFrame([
                 dict(rec.attributes, rec=rec)
@@ -194,12 +214,9 @@ class RegionClassification(RequiresData):
             ]).convert_objects(convert_numeric=True)
 
         except struct.error as e:
-            raise InvalidShapefile(
-                self.data_dir_join(
-                    self.filename
-                )
-            ) from e
+            raise InvalidShapefile(source) from e
 
+    @timed('region_lookup')
     def get(self, key, value):
         """
         For some values, will return a list that should be combined
@@ -231,36 +248,29 @@ class SA4(RegionClassification):
 
 class TownsData(RequiresData):
     service_name = 'towns'
+    required_services = ['aus_map']
 
     def has_required_data(self):
         return True
 
-    def has_cached(self):
-        return self.data_dir_exists('towns.pickle')
-
-    def load_cached(self):
-        with open(self.data_dir_join('towns.pickle'), 'rb') as fh:
-            return pickle.load(fh)
-
-    def cache(self, data):
-        with open(self.data_dir_join('towns.pickle'), 'wb') as fh:
-            pickle.dump(data, fh)
-        return data
-
     def get_towns(self):
-        if self.has_cached():
-            return self.load_cached()
+        source = self.services.aus_map.data_dir_join('AUS_adm.zip')
 
-        else:
-            path = self.services.aus_map.data_dir_join('AUS_adm.zip')
-            shire_data = shape_from_zip(path, 'AUS_adm2')
+        def build():
+            shire_data = shape_from_zip(source, 'AUS_adm2')
 
-            val = combine_towns({
+            towns = combine_towns({
                 record.attributes['NAME_2'].strip(): record
                 for record in shire_data.records()
             })
-
-        return self.cache(val)
+            return list(towns.values()), None
+
+        # the towns are shared between processes
+        path = join(self.data_dir, 'towns.shared')
+        return {
+            record.attributes['NAME_2'].strip(): record
+            for record in shared(path, source, build).records
+        }
 
 
 SERVICES = [
@@ -0,0 +1,78 @@
+"""
+Splits the image providers between several build machines, balanced on how
+long each took to render previously.
+
+The assignment only depends on the providers and the build history, so each
+machine picks the same shards as long as they share `history.json`. Sharded
+builds save their measurements apart from it, so shards that start after
+others have finished are still assigned the same way.
+"""
+import re
+import argparse
+
+from .utils import get_name
+
+SHARD_RE = re.compile(r'^(\d+)/(\d+)$')
+
+
+def parse_shard(value):
+    """
+    Parses shards given as `index/count`, such as 1/4
+    """
+    match = SHARD_RE.match(value)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            '{} is not of the form index/count'.format(value)
+        )
+
+    index, count = map(int, match.groups())
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            '{} is not a shard between 1 and {}'.format(index, count)
+        )
+
+    return index, count
+
+
+def assign_shards(provs, count, cost, costliest_first=True):
+    """
+    Assigns each of `provs` to one of `count` shards, giving the costliest
+    remaining provider to the shard with the least total cost so far.
+
+    This is also how a pool of `count` workers ends up sharing `provs`, so
+    it doubles as a prediction of how long a build will take.
+    """
+    totals = [0] * count
+    shards = [[] for _ in range(count)]
+
+    ordered = (
+        sorted(provs, key=lambda prov: (-cost(prov), get_name(prov)))
+        if costliest_first else provs
+    )
+    for prov in ordered:
+        idx = totals.index(min(totals))
+        totals[idx] += cost(prov)
+        shards[idx].append(prov)
+
+    return shards
+
+
+def render_cost(history):
+    return lambda prov: history.estimate(get_name(prov), 'duration')
+
+
+def makespan(shards, cost):
+    return max(sum(map(cost, shard)) for shard in shards)
+
+
+def select_shard(provs, shard, history):
+    """
+    The providers that belong to `shard`, an `(index, count)` pair
+    """
+    index, count = shard
+    history_cost = render_cost(history)
+    # without any history, at least balance the number of providers
+    shards = assign_shards(
+        provs, count, lambda prov: history_cost(prov) or 1
+    )
+    return shards[index - 1]
@@ -1,5 +1,5 @@
 import sys
-from unittest.mock import patch
+import inspect
 from contextlib import contextmanager
 from collections import namedtuple
 from functools import wraps
@@ -9,16 +9,22 @@ import logging
 import zipfile
 import os
 
-import requests
-import sys
 from os.path import expanduser
 sys.path.insert(0, expanduser('~/Dropbox/temp/arcrest'))
-import arcrest.compat
-from betamax import Betamax
+
+from . import tracing
+from .lazy import lazy_import
+from .locking import atomic_path, produce_once
+
+requests = lazy_import('requests')
 
 Res = namedtuple('Res', 'url,headers,read')
 
 
+class ShapeFileNotFoundException(Exception):
+    pass
+
+
 def compat(func=None):
     if func:
         return compat_decorator(func)
@@ -35,11 +41,12 @@ def compat_decorator(func):
 
 
 def side_effect(req):
-    r = requests.get(
-        req.get_full_url(),
-        req.headers,
-        data=req.data
-    )
+    with tracing.span('GET', 'http', url=req.get_full_url()):
+        r = requests.get(
+            req.get_full_url(),
+            req.headers,
+            data=req.data
+        )
 
     return Res(r.url, r.headers, lambda: r.content)
 
@@ -49,6 +56,9 @@ def compat_context():
     """
     Patches in heavy-duty caching and requests-lib use
     """
+    from unittest.mock import patch
+    import arcrest.compat
+    from betamax import Betamax
 
     arcrest.compat.sess = requests.Session()
     with patch('arcrest.compat.urllib2.urlopen', side_effect=side_effect):
@@ -56,6 +66,25 @@ def compat_context():
             yield
 
 
+def not_implemented():
+    frame = inspect.currentframe()
+    assert frame
+    frame_info = frame.f_back
+    assert frame_info
+    msg = ''
+
+    if 'self' in frame_info.f_locals:
+        self = frame_info.f_locals['self']
+        try:
+            msg += self.__name__ + '#'  # for static/class methods
+        except AttributeError:
+            msg += self.__class__.__name__ + '.'
+
+    msg += frame_info.f_code.co_name + '()'
+
+    return NotImplementedError(msg)
+
+
 def get_name(obj):
     try:
         return obj.__name__
@@ -88,6 +117,23 @@ def move_old(filename):
     )
 
 
+def listdir_r(path):
+    'Recursive listdir'
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            yield os.path.join(root, filename)
+
+
+def touch(path):
+    """
+    Marks `path` as having just been used; see `saau.cache`
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
 def unzip(path):
     """
     Unzips the specified zip file into the subdirectory of it's containing
@@ -95,15 +141,22 @@ def unzip(path):
     """
     dest = splitext(path)[0]
 
-    if not (exists(dest) and isdir(dest) and os.listdir(dest)):
+    def is_extracted():
+        return exists(dest) and isdir(dest) and os.listdir(dest)
+
+    def extract():
         logging.info("%s not yet extracted, extracting...", path)
-        os.makedirs(dest, exist_ok=True)
+        # extracted beside dest, so that it's never seen half extracted
+        with atomic_path(dest) as staging:
+            os.makedirs(staging)
+            try:
+                with zipfile.ZipFile(path) as zipper:
+                    zipper.extractall(staging)
+            except zipfile.BadZipfile as e:
+                raise Exception(path) from e
 
-        try:
-            with zipfile.ZipFile(path) as zipper:
-                zipper.extractall(dest)
-        except zipfile.BadZipfile as e:
-            raise Exception(path) from e
+    if not produce_once(dest, is_extracted, extract):
+        touch(dest)
 
     return dest
 
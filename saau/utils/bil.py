@@ -1,4 +1,6 @@
-import rasterio
+from .lazy import lazy_import
+
+rasterio = lazy_import('rasterio')
 
 
 def open_bil(base):
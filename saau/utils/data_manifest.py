@@ -0,0 +1,75 @@
+"""
+A record, kept in each data_dir, of the data files written there: their
+size, modification time, digest and whether they passed validation.
+
+This lets providers tell whether their data is ready with a stat call,
+rather than loading it all again on every run to check it's usable. Files
+that have changed since they were recorded are validated again.
+"""
+import os
+import json
+from os.path import join, relpath
+from typing import Any, Dict, Optional
+
+from .fingerprint import file_digest
+from .locking import atomic_write, file_lock
+
+FILENAME = '.data.json'
+
+
+class DataManifest(object):
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.filename = join(data_dir, FILENAME)
+
+    def read(self) -> Dict[str, Any]:
+        try:
+            with open(self.filename) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def key(self, path):
+        return relpath(path, self.data_dir)
+
+    def status(self, path) -> Optional[bool]:
+        """
+        Whether `path` passed validation when it was recorded, or None if it
+        hasn't been recorded as it is now
+        """
+        entry = self.read().get(self.key(path))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if entry is None or entry['size'] != stat.st_size:
+            return None
+
+        if entry['mtime'] != stat.st_mtime_ns:
+            # touched, but perhaps not changed
+            if file_digest(path) != entry['digest']:
+                return None
+            self.record(path, entry['valid'])
+
+        return entry['valid']
+
+    def record(self, path, valid):
+        """
+        Records the current contents of `path`, and whether they're valid
+        """
+        stat = os.stat(path)
+        entry = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'digest': file_digest(path),
+            'valid': valid
+        }
+
+        # other providers, in other processes too, may share this data_dir
+        with file_lock(self.filename):
+            entries = self.read()
+            entries[self.key(path)] = entry
+
+            with atomic_write(self.filename) as fh:
+                json.dump(entries, fh, indent=4, sort_keys=True)
@@ -2,47 +2,96 @@ import humanize
 import requests
 import logging
 from shutil import copyfileobj
+from tempfile import TemporaryFile
 from zipfile import ZipFile
-from io import BytesIO
-from os.path import exists, splitext
+from os.path import basename, dirname, exists, splitext
 from typing import List
 
+from tqdm import tqdm
+
+from .. import tracing
+from ..locking import atomic_write, file_lock
+from .segmented import (
+    SegmentedDownload, CONNECTIONS, CHUNK_SIZE, TIMEOUT
+)
+
 IMAGES: List[str] = []
 
 
-def get_binary(url, filename):
-    r = requests.head(url)
+def get_binary(url, filename, connections=CONNECTIONS):
+    """
+    Downloads `url` to `filename`. Servers that accept range requests are
+    downloaded from over several connections, resuming from wherever an
+    interrupted download got to.
+    """
+    existed = exists(filename)
 
-    if 'Content-Length' in r.headers:
-        logging.warning(
-            '%s is quite large at %s. '
-            'Considering downloading it manually?',
-            url,
-            humanize.naturalsize(int(r.headers['Content-Length']))
-        )
+    # other processes may be after the same file
+    with file_lock(filename):
+        if exists(filename) and not existed:
+            return True
 
-    r = requests.get(url, stream=True)
+        with tracing.span('HEAD', 'http', url=url):
+            r = requests.head(url, allow_redirects=True, timeout=TIMEOUT)
 
-    with open(filename, 'wb') as fh:
-        copyfileobj(
-            r.raw,
-            fh
-        )
+        if 'Content-Length' in r.headers:
+            logging.info(
+                'Downloading %s, which is %s',
+                url,
+                humanize.naturalsize(int(r.headers['Content-Length']))
+            )
+
+        if (r.ok and r.headers.get('Accept-Ranges') == 'bytes' and
+                'Content-Length' in r.headers):
+            SegmentedDownload(url, filename, r.headers, connections).run()
+        else:
+            download_whole(url, filename)
 
     return True
 
 
-def get_abs_csv(url, filename):
-    r = requests.get(url)
-    assert r.ok, r.json()
-    content = r.content
+def download_whole(url, filename):
+    """
+    Downloads `url` to `filename` over a single connection, for servers
+    that don't accept range requests
+    """
+    with tracing.span('GET', 'http', url=url):
+        r = requests.get(url, stream=True, timeout=TIMEOUT)
+        r.raise_for_status()
 
+        progress = tqdm(
+            total=int(r.headers.get('Content-Length', 0)) or None,
+            unit='B',
+            unit_scale=True,
+            desc=basename(filename)
+        )
+        with progress, atomic_write(filename, 'wb') as fh:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                fh.write(chunk)
+                progress.update(len(chunk))
+
+
+def get_abs_csv(url, filename):
+    """
+    Downloads the zipped csv at `url`, extracting it to `filename`. The zip
+    is spooled to disk beside `filename` and extracted in chunks, so that
+    neither is ever held in memory.
+    """
     assert splitext(filename)[1] == '.csv'
 
-    with ZipFile(BytesIO(content)) as ziper:
-        data = ziper.read(ziper.namelist()[0])
+    with tracing.span('GET', 'http', url=url):
+        r = requests.get(url, stream=True, timeout=TIMEOUT)
+        assert r.ok, r.json()
+
+        with TemporaryFile(dir=dirname(filename) or None) as spool:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                spool.write(chunk)
+            spool.seek(0)
 
-    with open(filename, 'wb') as fh:
-        fh.write(data)
+            with ZipFile(spool) as ziper:
+                member = ziper.namelist()[0]
+                with ziper.open(member) as src:
+                    with atomic_write(filename, 'wb') as fh:
+                        copyfileobj(src, fh, CHUNK_SIZE)
 
     return exists(filename)
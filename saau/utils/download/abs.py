@@ -9,6 +9,9 @@ from functools import lru_cache
 import pandas
 import requests
 
+from ..profiling import timed
+from .. import tracing
+
 BASE = 'https://itt.abs.gov.au/itt/query.jsp'
 
 
@@ -21,10 +24,11 @@ def query(method, params):
         'method': method,
         'format': 'json'
     })
-    r = requests.get(
-        BASE,
-        params=params
-    )
+    with tracing.span(method, 'http', url=BASE, params=params):
+        r = requests.get(
+            BASE,
+            params=params
+        )
     if r.url.endswith('unavailable'):
         raise ABSException("Service currently down")
 
@@ -192,6 +196,7 @@ def collapse_concepts(concepts):
     return {t['name']: t['Value'] for t in concepts}
 
 
+@timed('load_data')
 def abs_data_to_dataframe(data, delete_cols=None):
     data = [
         dict(
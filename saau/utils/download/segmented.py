@@ -0,0 +1,210 @@
+"""
+Downloading large files over several connections at once, each fetching
+its own byte range, and picking up where a dropped download left off.
+
+The download is written to `<filename>.part`, beside a record of how far
+each segment got in `<filename>.part.json`, and is renamed into place once
+every segment is complete. The record is only trusted while the size, ETag
+and Last-Modified reported by the server still match.
+"""
+import os
+import json
+import logging
+import threading
+from os.path import basename, exists
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tqdm import tqdm
+
+from .. import tracing
+from ..locking import atomic_write
+
+CONNECTIONS = 4
+# files smaller than this are fetched over a single connection
+MIN_SEGMENT_SIZE = 8 * 1024 ** 2
+CHUNK_SIZE = 256 * 1024
+# how often to record the progress of each segment, for resuming
+SAVE_EVERY = 16 * 1024 ** 2
+# attempts at each segment before giving up on the download
+ATTEMPTS = 5
+TIMEOUT = 60
+
+
+class Segment(object):
+
+    def __init__(self, start, end, done=0):
+        # the inclusive byte range fetched by this segment
+        self.start = start
+        self.end = end
+        self.done = done
+
+    @property
+    def remaining(self):
+        return self.end + 1 - (self.start + self.done)
+
+    @property
+    def complete(self):
+        return self.remaining <= 0
+
+    def to_json(self):
+        return [self.start, self.end, self.done]
+
+
+def plan_segments(size, connections=CONNECTIONS):
+    count = max(1, min(connections, size // MIN_SEGMENT_SIZE))
+    bounds = [size * idx // count for idx in range(count + 1)]
+    return [
+        Segment(start, end - 1)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+def validator(headers):
+    return [
+        headers.get('Content-Length'),
+        headers.get('ETag'),
+        headers.get('Last-Modified')
+    ]
+
+
+class SegmentedDownload(object):
+
+    def __init__(self, url, filename, headers, connections=CONNECTIONS):
+        self.url = url
+        self.filename = filename
+        self.partial = filename + '.part'
+        self.state_filename = self.partial + '.json'
+        self.size = int(headers['Content-Length'])
+        self.validator = validator(headers)
+        self.connections = connections
+        self.lock = threading.Lock()
+        self.segments = self.resume() or self.restart()
+
+    def resume(self):
+        """
+        The segments of an earlier attempt at this download, if the file
+        hasn't changed on the server since
+        """
+        if not exists(self.partial):
+            return None
+        try:
+            with open(self.state_filename) as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        if state['validator'] != self.validator:
+            logging.info(
+                '%s changed since it was partly downloaded', self.url
+            )
+            return None
+
+        segments = [Segment(*segment) for segment in state['segments']]
+        logging.info(
+            'Resuming %s from %d of %d bytes',
+            self.url, sum(segment.done for segment in segments), self.size
+        )
+        return segments
+
+    def restart(self):
+        with open(self.partial, 'wb') as fh:
+            fh.truncate(self.size)
+        segments = plan_segments(self.size, self.connections)
+        self.save_state(segments)
+        return segments
+
+    def save_state(self, segments=None):
+        state = {
+            'validator': self.validator,
+            'segments': [
+                segment.to_json() for segment in segments or self.segments
+            ]
+        }
+        with atomic_write(self.state_filename) as fh:
+            json.dump(state, fh)
+
+    def fetch(self, segment, progress):
+        """
+        Fetches what's left of `segment`, retrying dropped connections from
+        where they got to
+        """
+        for attempt in range(1, ATTEMPTS + 1):
+            if segment.complete:
+                return
+            try:
+                self.fetch_range(segment, progress)
+            except (requests.RequestException, OSError) as e:
+                logging.warning(
+                    'Segment %d-%d of %s failed on attempt %d: %s',
+                    segment.start, segment.end, self.url, attempt, e
+                )
+                if attempt == ATTEMPTS:
+                    raise
+            finally:
+                with self.lock:
+                    self.save_state()
+
+    def fetch_range(self, segment, progress):
+        first = segment.start + segment.done
+        headers = {'Range': 'bytes={}-{}'.format(first, segment.end)}
+
+        with tracing.span('GET', 'http', url=self.url, **headers):
+            r = requests.get(
+                self.url, headers=headers, stream=True, timeout=TIMEOUT
+            )
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise requests.RequestException(
+                    "Server ignored the range request"
+                )
+
+            unsaved = 0
+            with open(self.partial, 'r+b') as fh:
+                fh.seek(first)
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    # don't run past the segment should the server
+                    # send more than asked for
+                    chunk = chunk[:segment.remaining]
+                    fh.write(chunk)
+                    segment.done += len(chunk)
+                    progress.update(len(chunk))
+
+                    unsaved += len(chunk)
+                    if unsaved >= SAVE_EVERY:
+                        # what's recorded must already be on disk
+                        fh.flush()
+                        with self.lock:
+                            self.save_state()
+                        unsaved = 0
+
+        if not segment.complete:
+            raise requests.ConnectionError(
+                'Connection closed with {} bytes to go'.format(
+                    segment.remaining
+                )
+            )
+
+    def run(self):
+        done = sum(segment.done for segment in self.segments)
+        progress = tqdm(
+            total=self.size,
+            initial=done,
+            unit='B',
+            unit_scale=True,
+            desc=basename(self.filename)
+        )
+
+        pending = [
+            segment for segment in self.segments if not segment.complete
+        ]
+        with progress, ThreadPoolExecutor(max(1, len(pending))) as exe:
+            futures = [
+                exe.submit(self.fetch, segment, progress)
+                for segment in pending
+            ]
+            for future in futures:
+                future.result()
+
+        os.replace(self.partial, self.filename)
+        os.remove(self.state_filename)
@@ -0,0 +1,77 @@
+"""
+Content fingerprints for files, cached against their size and mtime so that
+the multi-gigabyte archives only get hashed when they actually change.
+"""
+import os
+import json
+import hashlib
+import logging
+from os.path import exists, isdir
+
+from . import listdir_r
+from .locking import atomic_write
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Fingerprinter(object):
+
+    def __init__(self, cache_filename):
+        self.cache_filename = cache_filename
+        self.cache = {}
+
+        if exists(cache_filename):
+            try:
+                with open(cache_filename) as fh:
+                    self.cache = json.load(fh)
+            except ValueError:
+                logging.warning('Discarding corrupt %s', cache_filename)
+
+    def save(self):
+        with atomic_write(self.cache_filename) as fh:
+            json.dump(self.cache, fh)
+
+    def digest(self, path):
+        """
+        Returns the digest of `path`, or None if it doesn't exist
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = [stat.st_size, stat.st_mtime_ns]
+        cached = self.cache.get(path)
+        if cached and cached[:2] == key:
+            return cached[2]
+
+        digest = file_digest(path)
+        self.cache[path] = key + [digest]
+        return digest
+
+    def fingerprint(self, paths):
+        """
+        Combines the digests of `paths` into a single fingerprint.
+        Directories contribute each of the files beneath them.
+        """
+        files = set()
+        for path in paths:
+            if isdir(path):
+                files.update(listdir_r(path))
+            else:
+                files.add(path)
+
+        combined = hashlib.sha1()
+        for path in sorted(files):
+            combined.update(
+                '{}={}\n'.format(path, self.digest(path)).encode()
+            )
+        return combined.hexdigest()
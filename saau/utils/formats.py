@@ -0,0 +1,104 @@
+"""
+The formats that `RequiresData.save_json` can store data in.
+
+Data is always saved under the name it's given, such as 'median_ages.json',
+with the suffix of its format appended; json itself has no suffix, so that
+files saved before the choice of format existed are still found, and are
+migrated to the provider's format the first time they're loaded, though the
+original is kept.
+
+Whatever the format, data is saved as it would be loaded back from json, so
+that data saved in one format is the same as that migrated from another.
+"""
+import gzip
+import json
+import pickle
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict
+
+from . import not_implemented
+
+
+class Format(ABC):
+    # appended to the name data is saved under
+    suffix: str
+
+    @abstractmethod
+    def dump(self, data: Any, filename: str) -> None:
+        raise not_implemented()
+
+    @abstractmethod
+    def load(self, filename: str) -> Any:
+        raise not_implemented()
+
+
+class JSONFormat(Format):
+    suffix = ''
+
+    def dump(self, data, filename):
+        with open(filename, 'w') as fh:
+            json.dump(data, fh, indent=4)
+
+    def load(self, filename):
+        with open(filename) as fh:
+            return json.load(fh)
+
+
+class PickleFormat(Format):
+    suffix = '.pickle'
+
+    def dump(self, data, filename):
+        with open(filename, 'wb') as fh:
+            pickle.dump(data, fh, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, filename):
+        with open(filename, 'rb') as fh:
+            return pickle.load(fh)
+
+
+class CompressedPickleFormat(PickleFormat):
+    """
+    Pickles compressed just enough to squeeze the repetition out of ABS
+    responses, while staying quick to decompress
+    """
+    suffix = '.pickle.gz'
+
+    def dump(self, data, filename):
+        with gzip.open(filename, 'wb', compresslevel=1) as fh:
+            pickle.dump(data, fh, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, filename):
+        with gzip.open(filename, 'rb') as fh:
+            return pickle.load(fh)
+
+
+FORMATS: Dict[str, Format] = OrderedDict([
+    ('pickle.gz', CompressedPickleFormat()),
+    ('pickle', PickleFormat()),
+    ('json', JSONFormat()),
+])
+
+
+def json_equivalent(data):
+    """
+    `data` as it'd be loaded back from json, with tuples as lists and keys
+    as strings
+    """
+    return json.loads(json.dumps(data))
+
+
+def dumps_equal(a, b):
+    """
+    Whether `a` and `b` are the same once dumped as json, which unlike `==`
+    holds for data containing NaN
+    """
+    return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def search_order(preferred):
+    """
+    The formats to look for data in, starting with `preferred`
+    """
+    first = FORMATS[preferred]
+    return [first] + [fmt for fmt in FORMATS.values() if fmt is not first]
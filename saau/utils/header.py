@@ -1,6 +1,8 @@
 import numpy as np
 from lxml.etree import fromstring, XMLSyntaxError
 
+from .profiling import timed
+
 
 def parse_lines(lines):
     for line in lines:
@@ -16,6 +18,7 @@ def parse_lines(lines):
         yield line, attrs
 
 
+@timed('header')
 def render_header_to(font, ax, sy, lines, sx=0.5):
     y_points = (
         q / 20
@@ -0,0 +1,30 @@
+"""
+Deferred imports for the heavy libraries used to render images, such as
+matplotlib, cartopy, seaborn and rasterio, so that listing providers or
+downloading their data doesn't pay to import them.
+"""
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stands in for the module `name`, importing it the first time one of its
+    attributes is used. Only looking attributes up is passed on to the
+    module; setting them needs the module itself.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self.__name__)
+
+
+def lazy_import(name):
+    """
+    Returns the module `name` if it has already been imported, otherwise a
+    stand-in for it
+    """
+    return sys.modules.get(name) or LazyModule(name)
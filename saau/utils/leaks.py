@@ -0,0 +1,86 @@
+"""
+Settings for `python -m saau --leak-check`, which reports the figures and
+axes that survive each render, and how much the process grew while doing
+it, so that memory creeping up over a long build can be pinned on the
+providers responsible.
+"""
+import gc
+import sys
+import logging
+from collections import Counter
+
+from .memory import current_rss
+
+enabled = False
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def leakable_types():
+    """
+    The types worth reporting if they outlive a render. cartopy is only
+    checked for if something has already imported it.
+    """
+    from matplotlib.figure import Figure
+    types = [Figure]
+
+    if 'cartopy.mpl.geoaxes' in sys.modules:
+        types.append(sys.modules['cartopy.mpl.geoaxes'].GeoAxes)
+
+    return tuple(types)
+
+
+def survivors():
+    """
+    Counts the live objects of each of the `leakable_types`, by type name
+    """
+    gc.collect()
+    types = leakable_types()
+    return Counter(
+        type(obj).__name__
+        for obj in gc.get_objects()
+        if isinstance(obj, types)
+    )
+
+
+class LeakCheck(object):
+    """
+    Reports any new survivors, and the growth in resident memory, between
+    entering and leaving. Does nothing unless enabled.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.leaked = Counter()
+        self.growth = None
+
+    def __enter__(self):
+        if enabled:
+            self._before = survivors()
+            self._rss = current_rss()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not enabled:
+            return
+
+        self.leaked = survivors() - self._before
+        rss = current_rss()
+        if rss is not None and self._rss is not None:
+            self.growth = rss - self._rss
+
+        if self.leaked:
+            logging.warning(
+                '%s leaked %s', self.name,
+                ', '.join(
+                    '{} {}'.format(count, name)
+                    for name, count in sorted(self.leaked.items())
+                )
+            )
+        logging.info(
+            'Process grew by %s bytes while rendering %s',
+            self.growth, self.name
+        )
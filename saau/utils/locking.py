@@ -0,0 +1,187 @@
+"""
+Writing shared cache files safely when several render workers, threads or
+builds use the same cache at once.
+
+Files are written to a temporary path and renamed into place, so readers
+only ever see a complete file. Expensive artifacts are made under a lock
+shared between processes, and whoever waited for the lock checks whether
+the artifact was made in the meantime before making it again; so one
+process does the work while the others wait for it.
+"""
+import os
+import sys
+import shutil
+import threading
+from os.path import basename, dirname, exists, isdir
+from contextlib import contextmanager
+
+from . import tracing
+
+if sys.platform == 'win32':
+    import msvcrt
+
+    def _lock(fh):
+        while True:
+            try:
+                # gives up after ten seconds, so keep trying until it's free
+                msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _try_lock(fh):
+        try:
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock(fh):
+        fcntl.flock(fh, fcntl.LOCK_EX)
+
+    def _try_lock(fh):
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock(fh):
+        fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def staging_path(path):
+    # unique to this thread, so that concurrent writers don't collide
+    return '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+
+def remove_path(path):
+    if isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif exists(path):
+        os.remove(path)
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yields a temporary path to write the file or directory `path` to, which
+    replaces `path` once the block completes
+    """
+    staging = staging_path(path)
+    remove_path(staging)
+    try:
+        yield staging
+        if isdir(staging) and isdir(path):
+            # directories can't be renamed over, so the old one is moved
+            # aside first, leaving `path` missing only between the renames
+            old = staging_path(path) + '.old'
+            os.replace(path, old)
+            try:
+                os.replace(staging, path)
+            except BaseException:
+                os.replace(old, path)
+                raise
+            remove_path(old)
+        else:
+            os.replace(staging, path)
+    except BaseException:
+        remove_path(staging)
+        raise
+
+
+@contextmanager
+def atomic_write(filename, mode='w'):
+    """
+    Opens a temporary file to write the new contents of `filename` to,
+    which replaces it once the block completes
+    """
+    with atomic_path(filename) as staging:
+        with open(staging, mode) as fh:
+            yield fh
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on `path` between processes and threads for the
+    duration of the block, waiting until it's free
+    """
+    os.makedirs(dirname(path) or '.', exist_ok=True)
+    lock_path = path + '.lock'
+
+    while True:
+        fh = open(lock_path, 'a+b')
+        with tracing.span(basename(path), 'lock'):
+            _lock(fh)
+        if _is_current(fh, lock_path):
+            break
+        # removed by `remove_unheld_lock` while we waited for it
+        _unlock(fh)
+        fh.close()
+
+    try:
+        yield
+    finally:
+        _unlock(fh)
+        fh.close()
+
+
+def _is_current(fh, lock_path):
+    try:
+        return os.path.samestat(os.fstat(fh.fileno()), os.stat(lock_path))
+    except FileNotFoundError:
+        return False
+
+
+def remove_unheld_lock(lock_path):
+    """
+    Removes the lock file `lock_path` left by `file_lock`, unless it's held,
+    returning whether it was removed
+    """
+    try:
+        fh = open(lock_path, 'a+b')
+    except OSError:
+        return False
+
+    with fh:
+        if not _try_lock(fh):
+            return False
+        try:
+            if sys.platform != 'win32':
+                # whoever opens it next finds it's no longer current
+                if not _is_current(fh, lock_path):
+                    return False
+                os.remove(lock_path)
+                return True
+        finally:
+            _unlock(fh)
+
+    # windows won't remove it while anyone else has it open
+    try:
+        os.remove(lock_path)
+        return True
+    except OSError:
+        return False
+
+
+def produce_once(path, is_ready, produce):
+    """
+    Calls `produce` to make `path`, unless `is_ready()` says it's already
+    been made, such as by another process while this one waited for it
+    """
+    if is_ready():
+        return False
+
+    with file_lock(path):
+        if is_ready():
+            return False
+        produce()
+        return True
@@ -0,0 +1,142 @@
+"""
+Results of expensive, pure computations kept on disk between renders, such
+as turning ABS responses into data frames or looking up the regions of each
+row.
+
+Results are keyed by the function, its arguments, and a fingerprint of the
+files it reads, including the module defining it and the `saau` modules that
+one imports, so they're recomputed once either changes. Each directory is kept within a size limit by evicting the
+results used least recently.
+"""
+import os
+import sys
+import pickle
+import hashlib
+import logging
+from os.path import join
+
+from .fingerprint import Fingerprinter
+from .sources import helper_files
+from . import tracing
+from .locking import atomic_write, file_lock, remove_unheld_lock
+
+SUFFIX = '.pickle'
+
+
+class Memo(object):
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.fingerprinter = Fingerprinter(join(directory, 'fingerprints.json'))
+
+    def key(self, name, args, kwargs, inputs, code=''):
+        digest = hashlib.sha1(name.encode())
+        digest.update(code.encode())
+        digest.update(
+            pickle.dumps((args, sorted(kwargs.items())), protocol=4)
+        )
+        digest.update(self.fingerprinter.fingerprint(inputs).encode())
+        return digest.hexdigest()
+
+    def call(self, name, func, args=(), kwargs=None, inputs=(), code=None):
+        """
+        Calls `func`, which is called `name`, with `args` and `kwargs`,
+        unless its result for them and the current contents of `inputs` is
+        already on disk. The result is also kept against `code`, the source
+        it depends on, which otherwise is the whole module defining `func`
+        along with the helpers it imports.
+        """
+        kwargs = kwargs or {}
+        inputs = list(inputs)
+        if code is None:
+            module = sys.modules.get(func.__module__)
+            filename = getattr(module, '__file__', None)
+            inputs.append(filename)
+            if filename:
+                inputs.extend(helper_files([filename]))
+        try:
+            key = self.key(
+                name, args, kwargs, filter(None, inputs), code or ''
+            )
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.warning("Can't memoize %s: %s", name, e)
+            return func(*args, **kwargs)
+        filename = join(self.directory, key + SUFFIX)
+
+        with tracing.span(name, 'memo'):
+            hit, value = self.load(name, filename)
+        if hit:
+            return value
+
+        # the others wait for whichever process computes it first
+        with file_lock(filename):
+            hit, value = self.load(name, filename)
+            if not hit:
+                value = func(*args, **kwargs)
+                self.store(filename, value)
+        return value
+
+    def load(self, name, filename):
+        try:
+            with open(filename, 'rb') as fh:
+                value = pickle.load(fh)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logging.warning('Discarding memoized %s: %s', name, e)
+            return False, None
+
+        # marks it as recently used
+        os.utime(filename)
+        return True, value
+
+    def store(self, filename, value):
+        try:
+            with atomic_write(filename, 'wb') as fh:
+                pickle.dump(value, fh, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # such as for results holding lambdas
+            logging.warning("Couldn't memoize %s: %s", filename, e)
+            return
+
+        self.fingerprinter.save()
+        self.evict()
+
+    def entries(self):
+        """
+        The (mtime, size, filename) of each stored result
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            filename = join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Removes the least recently used results until those left fit within
+        `max_size`
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, filename in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            remove_unheld_lock(filename + '.lock')
+            total -= size
+            logging.debug('Evicted %s', filename)
@@ -0,0 +1,86 @@
+"""
+Resident memory measurement, used to record the peak memory use of each
+render and to keep concurrent renders within a memory budget.
+"""
+import re
+import sys
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SIZE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)B?$', re.IGNORECASE)
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value):
+    """
+    Parses sizes such as '512M' or '8G' into a number of bytes
+    """
+    match = SIZE_RE.match(value.strip())
+    if not match:
+        raise ValueError('Invalid size: {}'.format(value))
+
+    number, unit = match.groups()
+    return int(float(number) * UNITS[unit.upper()])
+
+
+def current_rss():
+    """
+    The resident set size of this process in bytes, or None if it can't be
+    determined on this platform
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        pass
+    else:
+        import resource
+        return pages * resource.getpagesize()
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # the best we can do is the peak so far
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakMemory(object):
+    """
+    Samples the resident set size of this process while in use, to find
+    the peak
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
@@ -0,0 +1,61 @@
+"""
+Settings for `python -m saau --preview`, which trades fidelity for speed
+when iterating on styling: region geometry is heavily simplified, huge
+feature sets and rasters are sampled, and images are saved at a low dpi.
+"""
+from functools import wraps
+
+enabled = False
+
+DPI = 40
+# in degrees, as our geometries are in PlateCarree
+SIMPLIFY_TOLERANCE = 0.05
+MAX_FEATURES = 2000
+RASTER_STRIDE = 4
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def dpi():
+    """
+    The dpi to save figures at, or None for matplotlib's default
+    """
+    return DPI if enabled else None
+
+
+def sample(items, limit=MAX_FEATURES):
+    """
+    Evenly samples `items` down to at most `limit` items
+    """
+    items = list(items)
+    if not enabled or len(items) <= limit:
+        return items
+
+    step = len(items) / limit
+    return [items[int(idx * step)] for idx in range(limit)]
+
+
+def downsample(array, stride=RASTER_STRIDE):
+    """
+    Takes every `stride`th pixel along the first two axes of `array`
+    """
+    return array[::stride, ::stride] if enabled else array
+
+
+def simplified(add_geometries):
+    """
+    Wraps an `add_geometries` method such that the geometries are
+    simplified before they are drawn
+    """
+    @wraps(add_geometries)
+    def wrapper(geoms, *args, **kwargs):
+        if enabled:
+            geoms = [
+                geom.simplify(SIMPLIFY_TOLERANCE, preserve_topology=False)
+                for geom in geoms
+            ]
+        return add_geometries(geoms, *args, **kwargs)
+    return wrapper
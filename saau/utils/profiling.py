@@ -0,0 +1,140 @@
+"""
+Per-provider phase timings, as collected by `python -m saau --profile`.
+
+Each thread keeps a stack of the phases it's in; time is only attributed to
+the innermost phase, so the timings of a provider's phases add up to the
+time spent on it.
+
+Phases are also recorded as spans in the timeline, if tracing.
+"""
+import json
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import DefaultDict, Dict
+
+from . import tracing
+
+enabled = False
+_local = threading.local()
+_lock = threading.Lock()
+timings: DefaultDict[str, DefaultDict[str, float]] = defaultdict(
+    lambda: defaultdict(float)
+)
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+@contextmanager
+def provider(name):
+    """
+    Attributes phases within this block to the provider `name`
+    """
+    previous = getattr(_local, 'provider', None)
+    _local.provider = name
+    try:
+        yield
+    finally:
+        _local.provider = previous
+
+
+def _record(frame, now):
+    name, phase_name, start = frame
+    with _lock:
+        timings[name][phase_name] += now - start
+
+
+@contextmanager
+def phase(phase_name):
+    name = getattr(_local, 'provider', None)
+    with tracing.span(phase_name, 'phase', provider=name):
+        if not enabled or name is None:
+            yield
+        else:
+            with _timed(name, phase_name):
+                yield
+
+
+@contextmanager
+def _timed(name, phase_name):
+    stack = _local.__dict__.setdefault('stack', [])
+    now = time.perf_counter()
+    if stack:
+        # pause the enclosing phase
+        _record(stack[-1], now)
+
+    stack.append([name, phase_name, now])
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _record(stack.pop(), now)
+        if stack:
+            stack[-1][2] = now
+
+
+def timed(phase_name):
+    """
+    Decorator form of `phase`
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(phase_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def take() -> Dict[str, Dict[str, float]]:
+    """
+    Removes and returns the timings collected so far, such as to send them
+    back from a render worker
+    """
+    with _lock:
+        taken = {name: dict(phases) for name, phases in timings.items()}
+        timings.clear()
+    return taken
+
+
+def merge(other):
+    with _lock:
+        for name, phases in other.items():
+            for phase_name, duration in phases.items():
+                timings[name][phase_name] += duration
+
+
+def report(filename):
+    """
+    Writes the timings to `filename` as JSON, and logs a summary with the
+    slowest providers first
+    """
+    totals = {
+        name: sum(phases.values())
+        for name, phases in timings.items()
+    }
+
+    with open(filename, 'w') as fh:
+        json.dump(
+            {
+                name: dict(phases, total=totals[name])
+                for name, phases in timings.items()
+            },
+            fh,
+            indent=4,
+            sort_keys=True
+        )
+
+    logging.info('Profile written to %s', filename)
+    for name, total in sorted(totals.items(), key=lambda i: -i[1]):
+        logging.info('%8.2fs %s', total, name)
+
+        phases = sorted(timings[name].items(), key=lambda i: -i[1])
+        for phase_name, duration in phases:
+            logging.info('%8.2fs     %s', duration, phase_name)
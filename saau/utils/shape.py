@@ -1,19 +1,37 @@
 import os
 from os.path import splitext, join
-import cartopy.io.shapereader as shpreader
 
-from . import unzip
+from . import unzip, listdir_r, tracing, ShapeFileNotFoundException
+from .lazy import lazy_import
 
+shpreader = lazy_import('cartopy.io.shapereader')
 
-def listdir_r(path):
-    'Recursive listdir'
-    for root, _, filenames in os.walk(path):
-        for filename in filenames:
-            yield join(root, filename)
 
+class TracedReader(object):
+    """
+    A shapefile reader whose records and geometries are traced while
+    they're iterated over, which is when they're actually parsed
+    """
+
+    def __init__(self, reader, filename):
+        self.reader = reader
+        self.filename = filename
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
 
-class ShapeFileNotFoundException(Exception):
-    pass
+    def __len__(self):
+        return len(self.reader)
+
+    def traced(self, method):
+        with tracing.span(method, 'parse', shapefile=self.filename):
+            yield from getattr(self.reader, method)()
+
+    def records(self):
+        return self.traced('records')
+
+    def geometries(self):
+        return self.traced('geometries')
 
 
 def shape_from_zip(zip_filename, shape_filename=None):
@@ -22,21 +40,25 @@ def shape_from_zip(zip_filename, shape_filename=None):
     If shape_filename is None, we guess which shape file you want.
     """
 
-    dest = unzip(zip_filename)
+    with tracing.span('shape_from_zip', 'parse', zip=zip_filename):
+        dest = unzip(zip_filename)
+
+        if shape_filename is None:
+            shape_filenames = [
+                splitext(filename)[0]
+                for filename in listdir_r(dest)
+                if splitext(filename)[1] == '.shp'
+            ]
+            if not shape_filenames:
+                msg = "Couldn't find a .shp file in {}".format(zip_filename)
 
-    if shape_filename is None:
-        shape_filenames = [
-            splitext(filename)[0]
-            for filename in listdir_r(dest)
-            if splitext(filename)[1] == '.shp'
-        ]
-        if not shape_filenames:
-            msg = "Couldn't find a .shp file in {}".format(zip_filename)
+                if splitext(os.listdir(dest)[0])[1] == '.gdb':
+                    msg += '. Looks like a geodatabase instead.'
 
-            if splitext(os.listdir(dest)[0])[1] == '.gdb':
-                msg += '. Looks like a geodatabase instead.'
+                raise ShapeFileNotFoundException(msg)
+            shape_filename = shape_filenames[0]
 
-            raise ShapeFileNotFoundException(msg)
-        shape_filename = shape_filenames[0]
+        filename = join(dest, shape_filename)
+        reader = shpreader.Reader(filename)
 
-    return shpreader.Reader(join(dest, shape_filename))
+    return TracedReader(reader, filename)
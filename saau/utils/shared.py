@@ -0,0 +1,299 @@
+"""
+Read-only service data published to memory-mapped files.
+
+Rather than each render worker unpickling or parsing its own copy of the
+same geometries and reference tables, the first process to need them
+publishes them to a directory, which every process then maps in; the pages
+are shared through the page cache, so attaching is near-instant and costs
+next to no memory until the data is used.
+
+Geometries are kept as WKB in a single blob, alongside an array of where
+each one ends, and are only parsed when a record's geometry is used. Tables
+are kept as one .npy file per column. Columns of strings note which of their
+values are missing, such as None or NaN, so they're read back the same;
+other columns of objects are pickled.
+
+A published directory records the size and modification time of the file
+it was made from, and is republished once that changes.
+"""
+import os
+import json
+import pickle
+import logging
+from os.path import exists, join, getsize
+from collections import namedtuple
+from typing import Any, Dict, Optional
+
+from .lazy import lazy_import
+from . import touch
+from .locking import atomic_path, file_lock
+
+np = lazy_import('numpy')
+pandas = lazy_import('pandas')
+wkb = lazy_import('shapely.wkb')
+
+# bump when the layout of published directories changes
+VERSION = 2
+META = 'meta.json'
+# how missing values are marked in columns of strings
+PRESENT, NONE, NAN = 0, 1, 2
+
+Shared = namedtuple('Shared', 'records,frame')
+
+
+def stamp(source):
+    """
+    Identifies the current contents of `source` cheaply
+    """
+    stat = os.stat(source)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class GeometryStore(object):
+    """
+    Maps in geometries published by `write_geometries`, parsing each only
+    when it's asked for
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ends = np.load(join(path, 'geometries.ends.npy'), mmap_mode='r')
+        blob = join(path, 'geometries.wkb')
+        # numpy refuses to map empty files
+        self.blob = (
+            np.memmap(blob, dtype=np.uint8, mode='r')
+            if getsize(blob) else np.empty(0, np.uint8)
+        )
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getstate__(self):
+        # pickled by path, such as in memoized results, to be mapped in
+        # again when it's loaded
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __getitem__(self, idx):
+        start = self.ends[idx - 1] if idx else 0
+        end = self.ends[idx]
+        if start == end:
+            return None
+        return wkb.loads(self.blob[start:end].tobytes())
+
+
+class SharedRecord(object):
+    """
+    Stands in for a shapefile record, with a geometry that's parsed from
+    `store` the first time it's used
+    """
+
+    def __init__(self, attributes, store, index):
+        self.attributes = attributes
+        self._store = store
+        self._index = index
+
+    def __repr__(self):
+        return '<SharedRecord {}>'.format(self.attributes)
+
+    def __getstate__(self):
+        # the geometry is parsed from the store again
+        state = dict(self.__dict__)
+        state.pop('_geometry', None)
+        return state
+
+    @property
+    def geometry(self):
+        try:
+            return self._geometry
+        except AttributeError:
+            self._geometry = self._store[self._index]
+            return self._geometry
+
+
+def write_geometries(path, geometries):
+    ends = []
+    with open(join(path, 'geometries.wkb'), 'wb') as fh:
+        for geometry in geometries:
+            if geometry is not None:
+                fh.write(wkb.dumps(geometry))
+            ends.append(fh.tell())
+
+    np.save(join(path, 'geometries.ends.npy'), np.array(ends, np.int64))
+
+
+def is_nan(value):
+    return isinstance(value, float) and value != value
+
+
+def missing_marks(values):
+    """
+    Marks each of `values` as PRESENT, NONE or NAN, or returns None if any
+    aren't strings or missing
+    """
+    marks = np.zeros(len(values), np.int8)
+    for idx, value in enumerate(values):
+        if value is None:
+            marks[idx] = NONE
+        elif is_nan(value):
+            marks[idx] = NAN
+        elif not isinstance(value, str):
+            return None
+    return marks
+
+
+def write_table(path, frame):
+    """
+    Writes each column of `frame` to its own .npy file. Columns of strings
+    are stored as fixed width unicode so that they can be mapped too, with
+    their missing values marked beside them; any other columns of objects
+    are pickled.
+    """
+    columns = []
+    for idx, (name, column) in enumerate(frame.items()):
+        values = column.to_numpy()
+        filename = 'column.{}.npy'.format(idx)
+        kind = 'plain'
+
+        if values.dtype == object:
+            marks = missing_marks(values)
+            if marks is None:
+                kind = 'object'
+            else:
+                kind = 'str'
+                np.save(join(path, 'column.{}.missing.npy'.format(idx)), marks)
+                values = np.where(marks == PRESENT, values, '').astype(str)
+
+        np.save(join(path, filename), values, allow_pickle=kind == 'object')
+        columns.append([name, filename, kind])
+
+    return columns
+
+
+def read_column(path, filename, kind):
+    if kind == 'object':
+        return pandas.Series(
+            np.load(join(path, filename), allow_pickle=True), dtype=object
+        )
+
+    values = np.load(join(path, filename), mmap_mode='r')
+    if kind == 'plain':
+        return values
+
+    marks = np.load(join(path, filename.replace('.npy', '.missing.npy')))
+    if not marks.any():
+        return values
+
+    values = values.astype(object)
+    values[marks == NONE] = None
+    values[marks == NAN] = float('nan')
+    # or pandas may infer a type of its own, taking None for NaN
+    return pandas.Series(values, dtype=object)
+
+
+def publish(path, source, records=None, frame=None):
+    """
+    Publishes `records`, each with `attributes` and a `geometry`, and the
+    `frame` of plain columns to the directory `path`, as made from the file
+    `source`
+    """
+    meta: Dict[str, Any] = {'version': VERSION, 'source': stamp(source)}
+
+    with atomic_path(path) as staging:
+        os.makedirs(staging)
+
+        if records is not None:
+            write_geometries(staging, (record.geometry for record in records))
+            # pickled, so that their values keep their types
+            with open(join(staging, 'attributes.pickle'), 'wb') as fh:
+                pickle.dump(
+                    [dict(record.attributes) for record in records],
+                    fh,
+                    pickle.HIGHEST_PROTOCOL
+                )
+
+        if frame is not None:
+            meta['columns'] = write_table(staging, frame)
+
+        # written last, so that a directory with one is complete
+        with open(join(staging, META), 'w') as fh:
+            json.dump(meta, fh)
+
+    logging.info('Published %s to %s', source, path)
+
+
+def read_meta(path, source) -> Optional[Dict[str, Any]]:
+    """
+    The metadata of the directory `path`, if it's complete and was
+    published from the current contents of `source`
+    """
+    try:
+        with open(join(path, META)) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if meta['version'] != VERSION or meta['source'] != stamp(source):
+        return None
+    return meta
+
+
+def attach(path, source) -> Optional[Shared]:
+    """
+    The records and frame published to `path` from `source`, with their
+    data mapped in, or None if they need publishing
+    """
+    meta = read_meta(path, source)
+    if meta is None:
+        return None
+    touch(path)
+
+    records = frame = None
+    if exists(join(path, 'attributes.pickle')):
+        store = GeometryStore(path)
+        with open(join(path, 'attributes.pickle'), 'rb') as fh:
+            records = [
+                SharedRecord(attributes, store, idx)
+                for idx, attributes in enumerate(pickle.load(fh))
+            ]
+
+    if 'columns' in meta:
+        frame = pandas.DataFrame(
+            {
+                name: read_column(path, filename, kind)
+                for name, filename, kind in meta['columns']
+            },
+            copy=False
+        )
+
+    return Shared(records, frame)
+
+
+def shared(path, source, build) -> Shared:
+    """
+    Attaches to what's been published to `path` from `source`, first
+    publishing the records and frame returned by `build` if need be
+    """
+    attached = attach(path, source)
+    if attached is not None:
+        return attached
+
+    # only one process builds it, while the others wait to attach
+    with file_lock(path):
+        attached = attach(path, source)
+        if attached is not None:
+            return attached
+
+        built = Shared(*build())
+        try:
+            publish(path, source, *built)
+        except Exception:
+            logging.exception(
+                "Couldn't publish %s, so every process will build its own "
+                "copy of it", path
+            )
+            return built
+
+    return attach(path, source) or built
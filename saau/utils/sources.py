@@ -0,0 +1,60 @@
+"""
+Finding the source a computation depends on beyond the module defining it,
+such as the helpers and services it calls, so that results kept between
+builds are remade once any of that changes.
+"""
+import sys
+import types
+
+
+def imported_modules(module):
+    """
+    The names of the `saau` modules that `module` imports, or imports
+    functions or classes from
+    """
+    names = set()
+    for value in vars(module).values():
+        if isinstance(value, types.ModuleType):
+            # without touching lazily imported modules
+            name = value.__name__
+        elif isinstance(value, (type, types.FunctionType)):
+            name = value.__module__
+        else:
+            continue
+
+        # the build itself doesn't go into any render
+        if name.startswith('saau.') and name != 'saau.__main__':
+            names.add(name)
+    return names
+
+
+def helper_files(filenames):
+    """
+    The source of the `saau` modules imported by those of `filenames` that
+    are `saau` modules, and by those they import in turn, less `filenames`
+    themselves
+    """
+    by_file = {
+        getattr(module, '__file__', None): module
+        for name, module in list(sys.modules.items())
+        if name.startswith('saau.')
+    }
+    pending = [
+        by_file[filename]
+        for filename in filenames
+        if filename in by_file
+    ]
+    seen = set()
+
+    while pending:
+        module = pending.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        pending.extend(
+            sys.modules[name]
+            for name in imported_modules(module)
+            if name in sys.modules
+        )
+
+    return {sys.modules[name].__file__ for name in seen} - set(filenames)
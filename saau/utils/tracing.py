@@ -0,0 +1,111 @@
+"""
+A timeline of the build, as collected by `python -m saau --trace FILE`.
+
+Spans are recorded as Chrome trace events, which can be opened in Perfetto
+or chrome://tracing to see what each process and thread was doing, and
+where the build stalled.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Set, Tuple
+
+from .locking import atomic_write
+
+enabled = False
+_lock = threading.Lock()
+events: List[Dict[str, Any]] = []
+# the threads that have been named in `events`
+_named: Set[Tuple[int, int]] = set()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def _now():
+    # wall clock time, so that spans from different processes line up
+    return time.time() * 1e6
+
+
+def _metadata(name, pid, tid, value):
+    return {
+        'name': name, 'ph': 'M', 'pid': pid, 'tid': tid,
+        'args': {'name': value}
+    }
+
+
+def name_process(name):
+    """
+    Names this process in the timeline
+    """
+    if enabled:
+        with _lock:
+            events.append(_metadata('process_name', os.getpid(), 0, name))
+
+
+@contextmanager
+def span(name, category, **args):
+    """
+    Records the time spent in this block as a span called `name`
+    """
+    if not enabled:
+        yield
+        return
+
+    start = _now()
+    try:
+        yield
+    finally:
+        end = _now()
+        pid, tid = os.getpid(), threading.get_ident()
+
+        with _lock:
+            if (pid, tid) not in _named:
+                _named.add((pid, tid))
+                events.append(_metadata(
+                    'thread_name', pid, tid, threading.current_thread().name
+                ))
+
+            events.append({
+                'name': name, 'cat': category, 'ph': 'X',
+                'ts': start, 'dur': end - start,
+                'pid': pid, 'tid': tid, 'args': args
+            })
+
+
+def take():
+    """
+    Removes and returns the events recorded so far, such as to send them
+    back from a render worker
+    """
+    with _lock:
+        taken = list(events)
+        events.clear()
+    return taken
+
+
+def reset():
+    """
+    Forgets the events and thread names recorded so far, such as those a
+    render worker would otherwise have inherited
+    """
+    with _lock:
+        events.clear()
+        _named.clear()
+
+
+def merge(other):
+    with _lock:
+        events.extend(other)
+
+
+def write(filename):
+    with _lock, atomic_write(filename) as fh:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+
+    logging.info('Trace of %d events written to %s', len(events), filename)
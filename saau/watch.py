@@ -0,0 +1,79 @@
+"""
+Support for `python -m saau --watch`, which keeps the services loaded and
+re-renders image providers within seconds of their sources or data changing.
+"""
+import sys
+import logging
+import importlib
+from os.path import isdir
+
+from .utils import listdir_r
+from .manifest import source_files
+
+
+def watched_paths(prov, manifest, output):
+    """
+    The inputs recorded for `output` when it was last rendered, or if it
+    hasn't been, everything in `prov`'s data_dir
+    """
+    entry = manifest.outputs.get(output)
+    paths = set(source_files(prov))
+    paths.update(entry['inputs'] if entry else [prov.data_dir])
+    return paths
+
+
+def reload_provider(prov_cls, changed):
+    """
+    Reloads the modules defining `prov_cls` whose files are in `changed`,
+    base classes first, followed by the module of `prov_cls` itself so that
+    it picks up the reloaded bases. Returns the reloaded class.
+    """
+    modules = [
+        sys.modules[cls.__module__]
+        for cls in reversed(type.mro(prov_cls))
+        if cls.__module__.startswith('saau.')
+    ]
+
+    for module in modules[:-1]:
+        if module.__file__ in changed:
+            logging.info('Reloading %s', module.__name__)
+            importlib.reload(module)
+
+    module = importlib.reload(modules[-1])
+    return getattr(module, prov_cls.__name__)
+
+
+class Watcher(object):
+    """
+    Tracks the digests of the paths each provider is watching
+    """
+
+    def __init__(self, fingerprinter):
+        self.fingerprinter = fingerprinter
+        self.digests = {}
+        self.keys = set()
+
+    def changed(self, key, paths):
+        """
+        The paths watched under `key` that have changed or appeared since
+        they were last checked; nothing has on the first check. Directories
+        are expanded to the files beneath them.
+        """
+        first_check = key not in self.keys
+        self.keys.add(key)
+
+        files = set()
+        for path in paths:
+            if isdir(path):
+                files.update(listdir_r(path))
+            else:
+                files.add(path)
+
+        changed = set()
+        for path in files:
+            digest = self.fingerprinter.digest(path)
+            if not first_check and self.digests.get((key, path)) != digest:
+                changed.add(path)
+            self.digests[key, path] = digest
+
+        return changed
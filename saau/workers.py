@@ -0,0 +1,280 @@
+"""
+Process pool rendering.
+
+pyplot keeps global state, so rendering on threads gives no speedup and lets
+one thread's `plt.close('all')` close another's figure. Instead, each worker
+process builds its own `Services` container once and keeps it warm across
+every image provider it renders.
+
+Renders can leave memory behind however, so each worker is a separate
+single process pool that is replaced once it has rendered a given number of
+images or grown past a given size.
+
+Workers are spawned rather than forked, so that they don't inherit the
+timings and trace events collected so far, which they'd otherwise send back
+to be counted again, nor locks held by the download threads.
+"""
+import os
+import queue
+import multiprocessing
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from . import outputs
+from .utils import get_name, profiling, preview, leaks, tracing
+from .utils.memory import current_rss
+
+# the warm services container for this worker process
+_services = None
+# how often the dispatcher checks for newly ready providers
+POLL_INTERVAL = 0.1
+# modules whose `enabled` flag is carried over to the worker processes
+FLAGS = {
+    'profiling': profiling, 'preview': preview, 'leaks': leaks,
+    'tracing': tracing
+}
+
+
+def enabled_flags():
+    return [name for name, module in FLAGS.items() if module.enabled]
+
+
+def init_worker(flags, extra_outputs):
+    global _services
+    from .__main__ import setup_services
+
+    for name in flags:
+        FLAGS[name].enable()
+    # only what's measured in this worker is sent back
+    profiling.take()
+    tracing.reset()
+    tracing.name_process('render worker {}'.format(os.getpid()))
+    outputs.configure(extra_outputs)
+
+    logging.info('Setting up services for render worker')
+    _services = setup_services()
+
+
+def render(prov):
+    """
+    Renders `prov`, returning the result of `build_image` for it along with
+    any profiling timings and trace events collected while doing so, and the
+    size of this process afterwards
+    """
+    from .__main__ import initialize_providers, build_image
+
+    prov, = initialize_providers([prov], _services)
+    result = build_image(prov)
+    del prov
+
+    return result, profiling.take(), tracing.take(), current_rss()
+
+
+def feed(iterable, into):
+    """
+    Puts each item of `iterable` onto the queue `into` as it's produced,
+    followed by None
+    """
+    def run():
+        try:
+            for item in iterable:
+                into.put(item)
+        finally:
+            into.put(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+class RenderWorker(object):
+    """
+    A single render process, replaced with a fresh one after `max_renders`
+    renders or once it's over `max_rss` bytes
+    """
+
+    def __init__(self, initargs, max_renders=None, max_rss=None):
+        self.initargs = initargs
+        self.max_renders = max_renders
+        self.max_rss = max_rss
+        self.start()
+
+    def start(self):
+        self.exe = ProcessPoolExecutor(
+            1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=self.initargs
+        )
+        self.renders = 0
+
+    def submit(self, func, *args):
+        return self.exe.submit(func, *args)
+
+    def finished(self, rss, broken=False):
+        """
+        Called once each render submitted to this worker has completed,
+        with the size of its process afterwards
+        """
+        self.renders += 1
+
+        if broken:
+            reason = 'it died'
+        elif self.max_renders and self.renders >= self.max_renders:
+            reason = 'rendering {} images'.format(self.renders)
+        elif self.max_rss and rss is not None and rss > self.max_rss:
+            reason = 'growing to {} bytes'.format(rss)
+        else:
+            return
+
+        logging.info('Replacing render worker after %s', reason)
+        self.exe.shutdown()
+        self.start()
+
+    def shutdown(self):
+        self.exe.shutdown()
+
+
+class Dispatcher(object):
+    """
+    Submits image providers to the workers as they become ready, while there
+    is an idle worker and, given a `budget`, while their last recorded peak
+    memory use fits in what remains of it. A provider that could never fit
+    is still rendered once it has the pool to itself.
+
+    Of the providers that are ready, those that took longest to render last
+    time are dispatched first, so that a slow provider started last doesn't
+    hold up the whole build.
+    """
+
+    def __init__(self, workers, budget=None, history=None):
+        self.workers = workers
+        self.budget = budget
+        self.history = history
+        self.pending = []
+        self.running = {}
+        # the worker each running render was submitted to
+        self.assigned = {}
+
+    def idle(self):
+        busy = set(map(id, self.assigned.values()))
+        return [worker for worker in self.workers if id(worker) not in busy]
+
+    def cost(self, prov):
+        if self.budget is None or self.history is None:
+            return 0
+        return self.history.estimate(get_name(prov), 'peak_rss')
+
+    def duration(self, prov):
+        if self.history is None:
+            return 0
+        return self.history.estimate(get_name(prov), 'duration')
+
+    def admissible(self, prov):
+        if not self.idle():
+            return False
+        if not self.running or self.budget is None:
+            return True
+
+        in_use = sum(cost for _, cost in self.running.values())
+        return in_use + self.cost(prov) <= self.budget
+
+    def receive(self, ready, block):
+        """
+        Moves newly ready providers from the `ready` queue to those pending,
+        returning False once the queue is exhausted
+        """
+        try:
+            item = ready.get(timeout=POLL_INTERVAL) if block \
+                else ready.get_nowait()
+            while item is not None:
+                self.pending.append(item)
+                item = ready.get_nowait()
+        except queue.Empty:
+            return True
+
+        return False
+
+    def dispatch(self):
+        self.pending.sort(key=self.duration, reverse=True)
+
+        for prov in list(self.pending):
+            if not self.admissible(prov):
+                continue
+
+            self.pending.remove(prov)
+            # only the classes are sent across; each worker instantiates
+            # them against its own services container
+            worker = self.idle()[0]
+            future = worker.submit(render, type(prov))
+            self.running[future] = (get_name(prov), self.cost(prov))
+            self.assigned[future] = worker
+
+    def completed(self, timeout):
+        if not self.running:
+            return []
+
+        done, _ = wait(
+            self.running, timeout=timeout, return_when=FIRST_COMPLETED
+        )
+        return [
+            (future, self.running.pop(future)[0], self.assigned.pop(future))
+            for future in done
+        ]
+
+
+def render_in_processes(image_providers, workers, budget=None, history=None,
+                        max_renders=None, max_rss=None):
+    """
+    Renders `image_providers` across `workers` processes, dispatching each
+    as soon as it's yielded and can be admitted. Workers are replaced after
+    `max_renders` renders, or once they're over `max_rss` bytes.
+    """
+    logging.info('Rendering images across %d processes', workers)
+
+    ready = queue.Queue()
+    feed(image_providers, ready)
+
+    results = []
+    initargs = (enabled_flags(), outputs.extra)
+    pool = [
+        RenderWorker(initargs, max_renders, max_rss)
+        for _ in range(workers)
+    ]
+    try:
+        dispatcher = Dispatcher(pool, budget, history)
+        feeding = True
+
+        while feeding or dispatcher.pending or dispatcher.running:
+            if feeding:
+                # only wait on the queue if there are no renders to wait on
+                feeding = dispatcher.receive(
+                    ready, block=not dispatcher.running
+                )
+
+            dispatcher.dispatch()
+
+            for future, name, worker in dispatcher.completed(POLL_INTERVAL):
+                try:
+                    result, timings, events, rss = future.result()
+                except Exception as e:
+                    logging.exception(e)
+                    rss = None
+                    broken = isinstance(e, BrokenProcessPool)
+                else:
+                    broken = False
+                    results.append(result)
+                    profiling.merge(timings)
+                    tracing.merge(events)
+                    logging.info(
+                        'Worker rendered %s with a peak of %s bytes',
+                        name, result.peak_rss
+                    )
+                worker.finished(rss, broken)
+    finally:
+        for worker in pool:
+            worker.shutdown()
+
+    return results
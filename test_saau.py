@@ -1,16 +1,33 @@
 import sys
-from os.path import expanduser
+import time
+from concurrent.futures import Future
+from os.path import expanduser, exists
 import json
 from io import BytesIO
 from tempfile import mkdtemp
 from pathlib import Path
-from saau.__main__ import initialize_providers, Services
+from saau.__main__ import initialize_providers, ready_providers, Services
+from saau.services import required_services
+from saau.utils import profiling, preview, leaks, tracing
+from saau.utils.memory import parse_size
+from saau.history import BuildHistory, shard_filename, merge_histories
+from saau.workers import Dispatcher, RenderWorker
+from saau.sharding import assign_shards, select_shard
+from saau.watch import Watcher
+from saau.utils.shape import TracedReader
+from saau.utils.locking import file_lock
+from saau.utils.fingerprint import Fingerprinter
 from saau.sections.transportation.roads import RoadImageProvider
-from saau.loading import load_image_providers, load_service_providers
+from saau.loading import (
+    load_image_providers, load_service_providers, generate_manifest,
+    read_manifest
+)
+from saau.manifest import BuildManifest
 from urllib.response import addinfourl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Dict
 
-from pytest import fixture, xfail
+from pytest import fixture, raises, xfail
 
 
 @fixture
@@ -31,7 +48,865 @@ def test_load_service_providers(services):
 
 
 def test_load_image_providers():
-    assert list(load_image_providers(None))
+    from saau.sections.image_provider import implements_rendering
+
+    provs = list(load_image_providers(None))
+    assert provs
+    # either build_image, or prepare and draw, are implemented
+    assert [prov for prov in provs if not implements_rendering(prov)] == []
+
+
+def test_provider_manifest():
+    # regenerate with `python -m saau.loading` if this fails
+    assert generate_manifest() == read_manifest()
+
+
+HEAVY_MODULES = {
+    'matplotlib', 'cartopy', 'seaborn', 'rasterio', 'betamax', 'arcrest'
+}
+STARTUP = '''
+import saau.__main__
+from saau.loading import find_image_providers, load_classes
+# what --list needs, and then what --download_data imports
+find_image_providers(None)
+list(load_classes(find_image_providers(None)))
+'''
+
+
+def test_startup_imports():
+    import subprocess
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    )
+
+    # lines are 'import time: self [us] | cumulative | imported package'
+    imported = {}
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imported[name.strip()] = int(cumulative)
+
+    heavy = {
+        name: cumulative
+        for name, cumulative in imported.items()
+        if name.split('.')[0] in HEAVY_MODULES
+    }
+    assert not heavy, sorted(heavy.items(), key=lambda i: -i[1])[:10]
+
+
+def test_build_manifest(tmp_path):
+    source, output = tmp_path / 'source.json', tmp_path / 'output.png'
+    source.write_text('[1]')
+    output.write_text('')
+
+    manifest = BuildManifest(
+        str(tmp_path / 'manifest.json'),
+        str(tmp_path / 'fingerprints.json')
+    )
+    assert not manifest.is_fresh(str(output))
+
+    manifest.record(str(output), [str(source)])
+    manifest.save()
+    manifest = BuildManifest(
+        str(tmp_path / 'manifest.json'),
+        str(tmp_path / 'fingerprints.json')
+    )
+    assert manifest.is_fresh(str(output))
+
+    source.write_text('[1, 2]')
+    assert not manifest.is_fresh(str(output))
+
+
+def test_only_successful_renders_recorded(tmp_path):
+    from saau.__main__ import RenderResult, record_result
+
+    manifest = BuildManifest(
+        str(tmp_path / 'manifest.json'),
+        str(tmp_path / 'fingerprints.json')
+    )
+    history = BuildHistory(str(tmp_path / 'history.json'))
+
+    record_result(RenderResult('Failed', None, [], 10, 0.1), manifest, history)
+    record_result(
+        RenderResult('Rendered', str(tmp_path / 'out.png'), [], 20, 5.0),
+        manifest, history
+    )
+
+    assert history.get('Failed', 'duration') is None
+    assert history.get('Rendered', 'duration') == 5.0
+    assert list(manifest.outputs) == [str(tmp_path / 'out.png')]
+
+
+def test_provider_inputs_cover_code(tmp_path):
+    import saau.utils.header
+    import saau.services.aus_map
+    from saau.manifest import provider_inputs
+    from saau.sections.age.median import MedianAgeImageProvider
+
+    container = Services()
+    aus_map, = initialize_providers([saau.services.aus_map.AusMap], container)
+    container.inject([aus_map])
+    prov, = initialize_providers([MedianAgeImageProvider], container)
+    prov.services.aus_map
+
+    inputs = provider_inputs(prov)
+    # the services it used, and the helpers it draws with
+    assert saau.services.aus_map.__file__ in inputs
+    assert saau.utils.header.__file__ in inputs
+
+
+class SlowData:
+    def __init__(self, delay, has_data=True):
+        self.delay, self.has_data = delay, has_data
+
+    def has_required_data(self):
+        return False
+
+    def obtain_data(self):
+        time.sleep(self.delay)
+        return self.has_data
+
+
+class SlowService(SlowData):
+    service_name = 'slow'
+
+    def __init__(self, services):
+        super().__init__(0.1)
+        services.created = True
+
+
+def test_ready_providers():
+    services = Services(lambda serv, services: serv(services))
+    services.register([SlowService])
+    slow, fast, broken = SlowData(0.2), SlowData(0), SlowData(0, False)
+
+    ready = ready_providers([slow, fast, broken], services)
+
+    assert list(ready) == [fast, slow]
+    assert services.created
+
+
+def test_required_services(services):
+    from saau.sections.landcover.hay import HayImageProvider
+
+    assert required_services([HayImageProvider], services) == {
+        'aus_map', 'fonts'
+    }
+    assert required_services([object], services) == services.names()
+
+
+def test_profiling_nested_phases(monkeypatch):
+    monkeypatch.setattr(profiling, 'enabled', True)
+
+    with profiling.provider('Provider'):
+        with profiling.phase('build_image'):
+            time.sleep(0.05)
+            with profiling.phase('header'):
+                time.sleep(0.05)
+
+    timings = profiling.take()['Provider']
+    assert set(timings) == {'build_image', 'header'}
+    # time in the header isn't also counted against build_image
+    assert 0.05 <= timings['build_image'] < 0.1
+    assert profiling.take() == {}
+
+
+class FakeExecutor:
+    def submit(self, func, *args):
+        return Future()
+
+
+def test_tracing_spans(monkeypatch):
+    monkeypatch.setattr(tracing, 'enabled', True)
+    tracing.take()
+
+    with profiling.provider('Provider'):
+        with tracing.span('Provider', 'render'):
+            with profiling.phase('savefig'):
+                pass
+
+    events = tracing.take()
+    assert [event['ph'] for event in events] == ['M', 'X', 'X']
+
+    savefig, render = events[1:]
+    assert savefig['name'] == 'savefig'
+    assert savefig['args'] == {'provider': 'Provider'}
+    assert render['ts'] <= savefig['ts']
+    assert render['dur'] >= savefig['dur']
+    assert savefig['tid'] == events[0]['tid']
+    assert not tracing.events
+
+
+def test_shapefile_parsing_traced(monkeypatch):
+    monkeypatch.setattr(tracing, 'enabled', True)
+    tracing.take()
+
+    class Reader:
+        def records(self):
+            for idx in range(3):
+                time.sleep(0.01)
+                yield idx
+
+    assert list(TracedReader(Reader(), 'shapes').records()) == [0, 1, 2]
+
+    parse = tracing.take()[-1]
+    assert parse['name'] == 'records'
+    assert parse['args'] == {'shapefile': 'shapes'}
+    assert parse['dur'] >= 0.03 * 1e6
+
+
+def test_memory_budget_admission(tmp_path):
+    history = BuildHistory(str(tmp_path / 'history.json'))
+    provs = [type(name, (), {})() for name in ('Big', 'Bigger', 'Small')]
+    for prov, peak in zip(provs, ['6G', '6G', '3G']):
+        history.record(type(prov).__name__, peak_rss=parse_size(peak))
+
+    dispatcher = Dispatcher([FakeExecutor() for _ in range(4)], parse_size('10G'), history)
+    dispatcher.pending.extend(provs)
+    dispatcher.dispatch()
+
+    assert sorted(name for name, _ in dispatcher.running.values()) == [
+        'Big', 'Small'
+    ]
+    assert dispatcher.pending == [provs[1]]
+
+    # with the pool to itself, anything is admitted
+    dispatcher.running.clear()
+    dispatcher.assigned.clear()
+    dispatcher.dispatch()
+    assert not dispatcher.pending
+
+
+def test_dispatch_longest_first(tmp_path):
+    history = BuildHistory(str(tmp_path / 'history.json'))
+    provs = [type(name, (), {})() for name in ('Quick', 'Slow', 'Slower')]
+    for prov, duration in zip(provs, [1, 60, 120]):
+        history.record(type(prov).__name__, duration=duration)
+
+    dispatcher = Dispatcher([FakeExecutor()], None, history)
+    dispatcher.pending.extend(provs)
+    dispatcher.dispatch()
+
+    assert [name for name, _ in dispatcher.running.values()] == ['Slower']
+    assert dispatcher.pending == [provs[1], provs[0]]
+
+
+def test_worker_recycling():
+    worker = RenderWorker(([], []), max_renders=2, max_rss=parse_size('1G'))
+    exe = worker.exe
+
+    worker.finished(parse_size('512M'))
+    assert worker.exe is exe
+
+    worker.finished(parse_size('512M'))
+    assert worker.exe is not exe and worker.renders == 0
+
+    exe = worker.exe
+    worker.finished(parse_size('2G'))
+    assert worker.exe is not exe
+    worker.shutdown()
+
+
+def test_workers_start_without_parent_measurements(monkeypatch):
+    monkeypatch.setattr(profiling, 'enabled', True)
+    monkeypatch.setattr(tracing, 'enabled', True)
+    tracing.name_process('saau')
+    with profiling.provider('Provider'):
+        with profiling.phase('obtain_data'):
+            pass
+
+    worker = RenderWorker((['profiling', 'tracing'], []))
+    try:
+        assert worker.submit(profiling.take).result() == {}
+        # only the worker naming itself
+        events = worker.submit(tracing.take).result()
+        assert [event['name'] for event in events] == ['process_name']
+        assert events[0]['args']['name'].startswith('render worker')
+    finally:
+        worker.shutdown()
+        profiling.take()
+        tracing.reset()
+
+
+def test_leak_check(monkeypatch):
+    import matplotlib.pyplot as plt
+    monkeypatch.setattr(leaks, 'enabled', True)
+
+    with leaks.LeakCheck('Leaky') as check:
+        figure = plt.figure()
+    assert check.leaked == {'Figure': 1}
+
+    plt.close(figure)
+    del figure
+    with leaks.LeakCheck('Tidy') as check:
+        plt.close(plt.figure())
+    assert not check.leaked
+
+
+def test_save_outputs(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+    from matplotlib.image import imread
+    from saau import outputs
+
+    monkeypatch.setattr(outputs, 'extra', [
+        outputs.parse_output('png@20'), outputs.parse_output('svg')
+    ])
+    primary = str(tmp_path / 'image.png')
+    figure = plt.figure(figsize=(4, 3), dpi=50)
+
+    with plt.rc_context({'savefig.facecolor': 'red'}):
+        outputs.save_outputs(figure, primary)
+    plt.close(figure)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'image-20dpi.png', 'image.png', 'image.svg'
+    ]
+    assert imread(primary).shape[:2] == (150, 200)
+    # every output is saved as savefig is configured
+    assert imread(primary)[0, 0].tolist() == [1, 0, 0, 1]
+    smaller = imread(str(tmp_path / 'image-20dpi.png'))
+    assert smaller.shape[:2] == (60, 80)
+    assert smaller[0, 0].tolist() == [1, 0, 0, 1]
+    assert figure.dpi == 50
+
+
+def test_shared_records(tmp_path):
+    import pandas
+    from shapely.geometry import Point
+    from saau.utils import shared
+    from saau.services.aus_map import DummyRecord
+
+    source = tmp_path / 'source.zip'
+    source.write_bytes(b'zip')
+    path = str(tmp_path / 'source.shared')
+    built = []
+
+    def build():
+        built.append(True)
+        return [
+            DummyRecord({'NAME': 'a', 'CODE': 1}, Point(1, 2)),
+            DummyRecord({'NAME': None, 'CODE': 2}, None)
+        ], pandas.DataFrame({
+            'code': [1, 2],
+            'name': ['a', 'b'],
+            'state': pandas.Series(['x', None], dtype=object),
+            'area': pandas.Series([None, float('nan')], dtype=object),
+            'mixed': [1, 'b']
+        })
+
+    records, frame = shared.shared(path, str(source), build)
+    assert [record.attributes for record in records] == [
+        {'NAME': 'a', 'CODE': 1}, {'NAME': None, 'CODE': 2}
+    ]
+    assert records[0].geometry.equals(Point(1, 2))
+    assert records[1].geometry is None
+    assert frame.code.tolist() == [1, 2]
+    assert frame.name.tolist() == ['a', 'b']
+    # missing values and other objects are read back as they were
+    assert frame.state.tolist() == ['x', None]
+    assert frame.area[0] is None and frame.area[1] != frame.area[1]
+    assert frame.mixed.tolist() == [1, 'b']
+
+    assert shared.shared(path, str(source), build).records
+    assert len(built) == 1
+
+    # republished once the source changes
+    source.write_bytes(b'new zip')
+    shared.shared(path, str(source), build)
+    assert len(built) == 2
+
+
+def test_memoize(tmp_path):
+    from saau.sections.image_provider import RequiresData, memoized
+
+    calls = []
+
+    class Provider(RequiresData):
+        memo_max_size = 1024
+
+        def has_required_data(self):
+            return True
+
+        @memoized('data.txt')
+        def load_data(self, scale):
+            calls.append(scale)
+            with open(self.data_dir_join('data.txt')) as fh:
+                return [int(line) * scale for line in fh]
+
+    (tmp_path / 'data.txt').write_text('1\n2\n')
+    prov = Provider(str(tmp_path), Services())
+
+    assert prov.load_data(2) == [2, 4]
+    assert Provider(str(tmp_path), Services()).load_data(2) == [2, 4]
+    assert calls == [2]
+
+    # keyed on arguments and inputs
+    assert prov.load_data(3) == [3, 6]
+    (tmp_path / 'data.txt').write_text('5\n')
+    assert prov.load_data(2) == [10]
+    assert calls == [2, 3, 2]
+
+    # large results push out those used least recently
+    assert len(prov.memo.entries()) == 3
+    prov.memoize(bytes, 1000)
+    assert len(prov.memo.entries()) < 4
+    assert prov.memo.size() <= 1024
+
+
+
+def test_memoize_covers_helpers(tmp_path):
+    import saau.sections.ancestry
+    import saau.utils.download.abs
+    from saau.utils.memo import Memo
+
+    def load():
+        return 42
+    load.__module__ = saau.sections.ancestry.__name__
+
+    memo = Memo(str(tmp_path), 1024)
+    assert memo.call('load', load) == 42
+
+    # the module defining it, and the helper doing the work
+    assert saau.sections.ancestry.__file__ in memo.fingerprinter.cache
+    assert saau.utils.download.abs.__file__ in memo.fingerprinter.cache
+
+
+def test_staged_provider(tmp_path):
+    from saau.sections.image_provider import ImageProvider, prepare_code
+    from saau.sections.age.median import MedianAgeImageProvider
+
+    # drawing can change without invalidating what's been prepared
+    code = prepare_code(MedianAgeImageProvider)
+    assert 'def prepare(self):' in code
+    assert 'def draw(self, prepared):' not in code
+
+    calls = []
+
+    class Staged(ImageProvider):
+        required_services = []
+        prepare_inputs = ['data.txt']
+
+        def has_required_data(self):
+            return True
+
+        def prepare(self):
+            calls.append(True)
+            with open(self.data_dir_join('data.txt')) as fh:
+                return fh.read()
+
+        def draw(self, prepared):
+            return prepared.upper()
+
+    (tmp_path / 'data.txt').write_text('abc')
+    assert Staged(str(tmp_path), Services()).build_image() == 'ABC'
+    assert Staged(str(tmp_path), Services()).build_image() == 'ABC'
+    assert len(calls) == 1
+
+    (tmp_path / 'data.txt').write_text('def')
+    assert Staged(str(tmp_path), Services()).build_image() == 'DEF'
+    assert len(calls) == 2
+
+    # those that don't say which services they use depend on them all
+    service = tmp_path / 'service.txt'
+    service.write_text('1')
+    container = Services()
+    container.inject([type('Service', (), {
+        'accessed_paths': {str(service)}
+    })])
+    Staged.required_services = None
+    assert Staged(str(tmp_path), container).build_image() == 'DEF'
+    assert len(calls) == 3
+    service.write_text('2')
+    assert Staged(str(tmp_path), container).build_image() == 'DEF'
+    assert len(calls) == 4
+
+
+def test_data_formats(tmp_path):
+    from saau.sections.image_provider import RequiresData
+
+    class Provider(RequiresData):
+        def has_required_data(self):
+            return True
+
+    prov = Provider(str(tmp_path), Services())
+    data = {'series': [{'observations': [{'Value': 1}]}]}
+
+    # saved before formats were pluggable
+    (tmp_path / 'data.json').write_text(json.dumps(data))
+    assert prov.data_dir_exists('data.json')
+
+    assert prov.load_json('data.json') == data
+    # migrated, but the original is left as it was
+    assert sorted(
+        p.name for p in tmp_path.iterdir() if not p.name.startswith('.')
+    ) == ['data.json', 'data.json.pickle.gz']
+    assert json.loads((tmp_path / 'data.json').read_text()) == data
+    assert prov.data_dir_exists('data.json')
+    assert prov.load_json('data.json') == data
+
+    # loaded back as from json, whichever format it's saved in
+    prov.save_json('data.json', {1: (2, 3)})
+    assert prov.load_json('data.json') == {'1': [2, 3]}
+    assert not (tmp_path / 'data.json').exists()
+
+    prov.data_format = 'json'
+    prov.save_json('data.json', data)
+    assert json.loads((tmp_path / 'data.json').read_text()) == data
+    assert not (tmp_path / 'data.json.pickle.gz').exists()
+
+    # data with NaN, which isn't equal to itself, migrates all the same
+    prov.save_json('nan.json', {'Value': float('nan')})
+    prov.data_format = 'pickle'
+    prov.load_json('nan.json')
+    assert (tmp_path / 'nan.json.pickle').exists()
+
+
+def test_data_manifest(tmp_path, monkeypatch):
+    from saau.sections.image_provider import RequiresData
+
+    class Provider(RequiresData):
+        def has_required_data(self):
+            return self.has_valid_data('paths.json')
+
+        def is_valid_data(self, name, data):
+            return bool(data)
+
+    prov = Provider(str(tmp_path), Services())
+    assert not prov.has_required_data()
+
+    prov.save_json('paths.json', [])
+    prov.save_json('paths.json', [[1, 2]])
+
+    # answered from the manifest, without loading the data
+    monkeypatch.setattr(Provider, 'load_json', None)
+    assert prov.has_required_data()
+    monkeypatch.undo()
+
+    # validated again once it's changed
+    (tmp_path / 'paths.json.pickle.gz').unlink()
+    (tmp_path / 'paths.json').write_text('[]')
+    assert not prov.has_required_data()
+    (tmp_path / 'paths.json.pickle.gz').write_text('garbage')
+    assert not prov.has_required_data()
+
+
+def test_produce_once(tmp_path):
+    import threading
+    from multiprocessing import Pool
+    from zipfile import ZipFile
+    from saau.utils import unzip
+    from saau.utils.locking import produce_once
+
+    archive = tmp_path / 'archive.zip'
+    with ZipFile(str(archive), 'w') as zipper:
+        zipper.writestr('data.csv', 'a,b\n' * 1000)
+
+    # each extracts the same zip at once, but only one does the work
+    with Pool(4) as pool:
+        dests = pool.map(unzip, [str(archive)] * 8)
+    assert set(dests) == {str(tmp_path / 'archive')}
+    assert (tmp_path / 'archive' / 'data.csv').read_text().count('\n') == 1000
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith('.tmp')]
+
+    made = []
+
+    def produce():
+        time.sleep(0.05)
+        made.append(True)
+
+    threads = [
+        threading.Thread(
+            target=produce_once,
+            args=(str(tmp_path / 'thing'), lambda: bool(made), produce)
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(made) == 1
+
+
+def test_atomic_path_replaces_directories(tmp_path):
+    import os
+    from saau.utils.locking import atomic_path
+
+    path = tmp_path / 'extracted'
+    path.mkdir()
+    (path / 'old.csv').write_text('old')
+
+    with atomic_path(str(path)) as staging:
+        os.makedirs(staging)
+        (Path(staging) / 'new.csv').write_text('new')
+
+    assert os.listdir(str(path)) == ['new.csv']
+    assert os.listdir(str(tmp_path)) == ['extracted']
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves `server.files`, honouring range requests if `server.ranges`, and
+    dropping the connection after `server.truncate` bytes if set
+    """
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        data = self.server.files[self.path]
+        start, end = 0, len(data) - 1
+
+        requested = self.headers.get('Range')
+        if requested and self.server.ranges:
+            start, end = map(int, requested[len('bytes='):].split('-'))
+            self.send_response(206)
+            self.send_header(
+                'Content-Range', 'bytes {}-{}/{}'.format(start, end, len(data))
+            )
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(end + 1 - start))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        if body:
+            chunk = data[start:end + 1][:self.server.truncate]
+            self.server.served += len(chunk)
+            self.wfile.write(chunk)
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def stand_in_server():
+    import threading
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.files = {}
+    server.ranges = True
+    server.truncate = None
+    server.served = 0
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_segmented_download(tmp_path, monkeypatch, stand_in_server):
+    import os
+    from saau.utils.download import get_binary, segmented
+
+    monkeypatch.setattr(segmented, 'MIN_SEGMENT_SIZE', 1000)
+    monkeypatch.setattr(segmented, 'ATTEMPTS', 1)
+    monkeypatch.setattr(segmented, 'CHUNK_SIZE', 100)
+    data = os.urandom(10000)
+    stand_in_server.files['/big.zip'] = data
+    url = stand_in_server.url + '/big.zip'
+    filename = str(tmp_path / 'big.zip')
+
+    # dropped connections leave a partial download behind
+    stand_in_server.truncate = 1000
+    with raises(Exception):
+        get_binary(url, filename)
+    assert not os.path.exists(filename)
+    assert os.path.exists(filename + '.part.json')
+
+    # which is resumed, rather than fetched again
+    stand_in_server.truncate = None
+    stand_in_server.served = 0
+    assert get_binary(url, filename)
+    assert open(filename, 'rb').read() == data
+    assert stand_in_server.served == len(data) - 4 * 1000
+    assert sorted(os.listdir(str(tmp_path))) == ['big.zip', 'big.zip.lock']
+
+    # servers without range requests are downloaded from in one go
+    stand_in_server.ranges = False
+    os.remove(filename)
+    assert get_binary(url, filename)
+    assert open(filename, 'rb').read() == data
+
+
+def test_streaming_abs_csv(tmp_path, stand_in_server):
+    import tracemalloc
+    from zipfile import ZipFile, ZIP_DEFLATED
+    from saau.utils.download import get_abs_csv
+
+    rows = ''.join('{},Region {}\n'.format(idx, idx) for idx in range(10 ** 6))
+    archive = BytesIO()
+    with ZipFile(archive, 'w', ZIP_DEFLATED) as zipper:
+        zipper.writestr('regions.csv', rows)
+    stand_in_server.files['/regions.zip'] = archive.getvalue()
+    filename = str(tmp_path / 'regions.csv')
+
+    tracemalloc.start()
+    try:
+        assert get_abs_csv(stand_in_server.url + '/regions.zip', filename)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert open(filename).read() == rows
+    # neither the zip nor the csv were held in memory
+    assert peak < len(rows) / 4
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['regions.csv']
+
+
+def test_cache_gc(tmp_path):
+    import os
+    from saau import cache
+
+    data_dir = tmp_path / 'saau' / 'sections' / 'landcover'
+    (data_dir / 'shapes').mkdir(parents=True)
+    (data_dir / 'shapes.zip').write_bytes(b'z' * 100)
+    (data_dir / 'shapes' / 'shapes.shp').write_bytes(b's' * 300)
+    (data_dir / '.memo').mkdir()
+    (data_dir / '.memo' / 'old.pickle').write_bytes(b'p' * 50)
+    (data_dir / '.memo' / 'new.pickle').write_bytes(b'p' * 50)
+    os.utime(str(data_dir / '.memo' / 'old.pickle'), (0, 0))
+    (data_dir / 'cached_records.pickle').write_bytes(b'c' * 10)
+    os.utime(str(data_dir / 'cached_records.pickle'), (1, 1))
+    (data_dir / 'regions.csv.pickle').write_bytes(b'r' * 10)
+
+    kinds = {
+        os.path.basename(artifact.path): artifact.kind
+        for artifact in cache.find_artifacts(str(tmp_path))
+    }
+    assert kinds == {
+        'shapes': 'extracted', 'shapes.zip': 'download',
+        'old.pickle': 'memo', 'new.pickle': 'memo',
+        'cached_records.pickle': 'pickle', 'regions.csv.pickle': 'download'
+    }
+
+    # locks are removed unless they're held
+    (data_dir / 'shapes.zip.lock').write_bytes(b'')
+    with file_lock(str(data_dir / '.memo' / 'new.pickle')):
+        # extracted directories go first, then the least recently used
+        evicted = cache.gc(str(tmp_path), 160)
+        assert (data_dir / '.memo' / 'new.pickle.lock').exists()
+    assert not (data_dir / 'shapes.zip.lock').exists()
+    assert [os.path.basename(a.path) for a in evicted] == [
+        'shapes', 'old.pickle', 'cached_records.pickle'
+    ]
+    assert sorted(os.listdir(str(data_dir))) == [
+        '.memo', 'regions.csv.pickle', 'shapes.zip'
+    ]
+    assert sorted(os.listdir(str(data_dir / '.memo'))) == [
+        'new.pickle', 'new.pickle.lock'
+    ]
+
+    # downloads are never evicted
+    assert cache.gc(str(tmp_path), 0)[-1].kind == 'memo'
+    assert (data_dir / 'shapes.zip').exists()
+    assert (data_dir / 'regions.csv.pickle').exists()
+
+
+def test_font_extracted_again_without_downloading(tmp_path, monkeypatch):
+    import zipfile
+    from saau.services import fonts
+
+    name = fonts.FontProvider.FILENAME
+    with zipfile.ZipFile(str(tmp_path / (name + '.zip')), 'w') as zipper:
+        zipper.writestr(name + '.ttf', b'font')
+    monkeypatch.setattr(fonts, 'get_binary', None)
+
+    serv, = initialize_providers([fonts.FontProvider], Services())
+    serv.data_dir = str(tmp_path)
+    assert not serv.has_required_data()
+    assert serv.obtain_data()
+
+
+def test_assign_shards():
+    costs = {'a': 10, 'b': 7, 'c': 5, 'd': 3, 'e': 2, 'f': 1}
+    provs = [type(name, (), {}) for name in 'fedcba']
+
+    shards = assign_shards(provs, 2, lambda prov: costs[prov.__name__])
+
+    assert [[prov.__name__ for prov in shard] for shard in shards] == [
+        ['a', 'd', 'f'],
+        ['b', 'c', 'e']
+    ]
+    assert shards == assign_shards(
+        provs[::-1], 2, lambda prov: costs[prov.__name__]
+    )
+
+
+def test_shards_unaffected_by_earlier_shards(tmp_path):
+    filename = str(tmp_path / 'history.json')
+    provs = [type(name, (), {}) for name in 'abcdef']
+    history = BuildHistory(filename)
+    for duration, prov in enumerate(provs, 1):
+        history.record(prov.__name__, duration=duration)
+    history.save()
+
+    first = select_shard(provs, (1, 2), BuildHistory(filename))
+
+    # the first shard finishes, having rendered rather differently
+    history = BuildHistory(filename, shard_filename(filename, (1, 2)))
+    for prov in first:
+        history.record(prov.__name__, duration=100)
+    history.save()
+
+    second = select_shard(provs, (2, 2), BuildHistory(filename))
+    assert sorted(first + second, key=lambda prov: prov.__name__) == provs
+    assert not set(first) & set(second)
+
+    merged = merge_histories(filename)
+    assert all(merged.get(prov.__name__, 'duration') == 100 for prov in first)
+    assert BuildHistory(filename).providers == merged.providers
+    assert not exists(shard_filename(filename, (1, 2)))
+
+
+def test_merge_manifests(tmp_path):
+    from saau.collect import merge_manifests
+
+    (tmp_path / 'manifest.json').write_text(json.dumps({'a.png': 1}))
+    (tmp_path / 'manifest.shard-1-of-2.json').write_text(
+        json.dumps({'a.png': 2, 'b.png': 2})
+    )
+    assert merge_manifests(str(tmp_path)) == {'a.png': 2, 'b.png': 2}
+    assert not (tmp_path / 'manifest.shard-1-of-2.json').exists()
+
+    # a later unsharded build isn't undone by merging again
+    (tmp_path / 'manifest.json').write_text(json.dumps({'a.png': 3}))
+    assert merge_manifests(str(tmp_path)) == {'a.png': 3}
+
+
+def test_watcher(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'a.json').write_text('[]')
+
+    watcher = Watcher(Fingerprinter(str(tmp_path / 'fingerprints.json')))
+    assert watcher.changed('prov', [str(data)]) == set()
+    assert watcher.changed('prov', [str(data)]) == set()
+
+    (data / 'a.json').write_text('[1]')
+    (data / 'b.json').write_text('[]')
+    assert watcher.changed('prov', [str(data)]) == {
+        str(data / 'a.json'), str(data / 'b.json')
+    }
+    # each key tracks changes separately
+    assert watcher.changed('other', [str(data)]) == set()
+
+
+def test_preview_sampling(monkeypatch):
+    assert preview.sample(range(10), 3) == list(range(10))
+
+    monkeypatch.setattr(preview, 'enabled', True)
+    assert preview.sample(range(10), 3) == [0, 3, 6]
+    assert preview.sample(range(2), 3) == [0, 1]
 
 
 def responder(responses: Dict):